@@ -9,6 +9,7 @@ max_chars = 0
 class GTTS:
     def __init__(self):
         self.max_chars = 5000
+        self.max_workers = 4
         self.voices = []
 
     def run(self, text, filepath):
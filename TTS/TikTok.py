@@ -1,8 +1,7 @@
 import base64
 from utils import settings
 import random
-import requests
-from requests.adapters import HTTPAdapter, Retry
+from utils.sessions import pooled_session
 
 # from profanity_filter import ProfanityFilter
 # pf = ProfanityFilter()
@@ -66,7 +65,9 @@ class TikTok:  # TikTok Text-to-Speech Wrapper
             "https://api16-normal-useast5.us.tiktokv.com/media/api/text/speech/invoke/?text_speaker="
         )
         self.max_chars = 300
+        self.max_workers = 8
         self.voices = {"human": human, "nonhuman": nonhuman, "noneng": noneng}
+        self.session = pooled_session(pool_size=self.max_workers)
 
     def run(self, text, filepath, random_voice: bool = False):
         # if censor:
@@ -80,16 +81,8 @@ class TikTok:  # TikTok Text-to-Speech Wrapper
                 or random.choice(self.voices["human"])
             )
         )
-        try:
-            r = requests.post(f"{self.URI_BASE}{voice}&req_text={text}&speaker_map_type=0")
-        except requests.exceptions.SSLError:
-            # https://stackoverflow.com/a/47475019/18516611
-            session = requests.Session()
-            retry = Retry(connect=3, backoff_factor=0.5)
-            adapter = HTTPAdapter(max_retries=retry)
-            session.mount("http://", adapter)
-            session.mount("https://", adapter)
-            r = session.post(f"{self.URI_BASE}{voice}&req_text={text}&speaker_map_type=0")
+        # SSL and connection errors are retried by the session (https://stackoverflow.com/a/47475019)
+        r = self.session.post(f"{self.URI_BASE}{voice}&req_text={text}&speaker_map_type=0")
         # print(r.text)
         vstr = [r.json()["data"]["v_str"]][0]
         b64d = base64.b64decode(vstr)
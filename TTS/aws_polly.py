@@ -27,6 +27,7 @@ voices = [
 class AWSPolly:
     def __init__(self):
         self.max_chars = 3000
+        self.max_workers = 4
         self.voices = voices
 
     def run(self, text, filepath, random_voice: bool = False):
@@ -1,19 +1,31 @@
 #!/usr/bin/env python3
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Tuple
 import re
 import pickle
-# import sox
-# from mutagen import MutagenError
-# from mutagen.mp3 import MP3, HeaderNotFoundError
-import translators as ts
+import time
 from rich.progress import track
 from moviepy.editor import AudioFileClip, CompositeAudioClip, concatenate_audioclips
+from utils.audio import get_duration, save_manifest
+from utils.cache import FileCache
 from utils.console import print_step, print_substep
+from utils.translate import translate, translate_many
 from utils.voice import sanitize_text
 from utils import settings
 
 DEFAULT_MAX_LENGTH: int = 50  # video length variable
+DEFAULT_MAX_WORKERS: int = 1  # providers that don't declare max_workers are called sequentially
+TTS_CACHE_PATH = "assets/cache/tts"
+TTS_CACHE_VERSION = 2  # part of the key, 1 may hold durations misread from non-MP3 files
+
+# The config key holding the voice of each provider, part of the audio cache key
+VOICE_SETTINGS = {
+    "TikTok": "tiktok_voice",
+    "StreamlabsPolly": "streamlabs_polly_voice",
+    "AWSPolly": "aws_polly_voice",
+    "pyttsx": "python_voice",
+}
 
 
 class TTSEngine:
@@ -45,6 +57,9 @@ class TTSEngine:
         self.max_length = max_length
         self.length = 0
         self.last_clip_length = last_clip_length
+        self.durations = {}  # clip name -> seconds, saved for the final renderer
+        cache_size = settings.config["settings"]["tts"]["tts_cache_size"]
+        self.cache = FileCache(TTS_CACHE_PATH, cache_size, ".mp3") if cache_size else None
 
     def run(self) -> Tuple[int, int]:
 
@@ -57,6 +72,7 @@ class TTSEngine:
             pass
 
         print_step("Saving Text to MP3 files...")
+        translate_many([self.reddit_object["thread_title"], self.reddit_object["thread_post"]])
 
         self.call_tts("title", process_text(self.reddit_object["thread_title"])) # converting thread title to mp3
         processed_text = process_text(self.reddit_object["thread_post"])
@@ -79,6 +95,9 @@ class TTSEngine:
                 else:  # If the comment is not too long, just call the tts engine
                     self.call_tts(f"{idx}", process_text(comment["comment_body"]))
 
+        save_manifest(self.path, self.durations)
+        if self.cache is not None:
+            self.cache.flush()
         print_substep("Saved Text to MP3 files successfully.", style="bold green")
         return self.length, idx
 
@@ -113,36 +132,94 @@ class TTSEngine:
         split_text = re.findall(r'(?:\d[,.]|[^,.])*(?:[,.]|$)', text)
         split_text = list(filter(None, split_text))
         #print(split_text) # debug
+        translate_many(split_text)  # one batched request instead of one per line
         with open(f"{self.path}/{filebasename}.pickle", "wb") as file:
             pickle.dump(split_text, file)    # Saving text to use as captions
         offset = 0
+        parts = []
         for idy, text_cut in enumerate(split_text):
             new_text = process_text(text_cut)
             if not new_text or new_text.isspace():
                 offset += 1
                 continue
-            self.call_tts(f"{filebasename}.part{idy - offset}", new_text)
-                       
+            parts.append((f"{filebasename}.part{idy - offset}", new_text))
+
+        # The part filenames are fixed before any request is made, so the workers may finish in
+        # any order and the files on disk still line up with the captions.
+        with ThreadPoolExecutor(max_workers=self.workers()) as executor:
+            results = list(executor.map(lambda part: self.try_tts(*part), parts))
+
+        failed = [filename for (filename, _), duration in zip(parts, results) if duration is None]
+        for (filename, _), duration in zip(parts, results):
+            if duration is not None:
+                self.durations[filename] = duration
+                self.last_clip_length = duration
+                self.length += duration
+        if failed:
+            raise RuntimeError(f"TTS failed for {', '.join(failed)} after {self.retries()} retries")
+
+    def workers(self) -> int:
+        """Number of concurrent requests to make, capped by what the provider supports."""
+        provider_max = getattr(self.tts_module, "max_workers", DEFAULT_MAX_WORKERS)
+        configured = settings.config["settings"]["tts"]["tts_workers"] or provider_max
+        return max(1, min(int(configured), provider_max))
+
+    def retries(self) -> int:
+        return int(settings.config["settings"]["tts"]["tts_retries"])
+
+    def try_tts(self, filename: str, text: str):
+        """Synthesizes a single part, retrying it on its own if the provider fails.
+
+        Returns:
+            float|None: Duration of the saved clip, None if every attempt failed
+        """
+        for attempt in range(self.retries() + 1):
+            try:
+                return self.synthesize(filename, text)
+            except Exception as error:  # providers raise all sorts of things
+                print_substep(
+                    f"TTS attempt {attempt + 1} for {filename} failed: {error}", style="red"
+                )
+                if attempt < self.retries():
+                    time.sleep(2**attempt)
+        return None
+
+    def synthesize(self, filename: str, text: str) -> float:
+        filepath = f"{self.path}/{filename}.mp3"
+        if self.cache is not None:
+            key = self.cache_key(text)
+            cached = self.cache.get(key, filepath)
+            if cached is not None:
+                return cached["duration"]
+        Path(filepath).unlink(missing_ok=True)
+        self.tts_module.run(text, filepath=filepath)
+        duration = self.clip_duration(filename)
+        if self.cache is not None:
+            self.cache.put(key, filepath, duration=duration)
+        return duration
+
+    def cache_key(self, text: str) -> str:
+        provider = type(self.tts_module).__name__
+        voice_setting = VOICE_SETTINGS.get(provider)
+        voice = settings.config["settings"]["tts"][voice_setting] if voice_setting else ""
+        lang = settings.config["reddit"]["thread"]["post_lang"]
+        return FileCache.key(TTS_CACHE_VERSION, provider, voice, lang, sanitize_text(text))
+
+    def clip_duration(self, filename: str) -> float:
+        # Read from the file headers, opening an AudioFileClip would start an ffmpeg process
+        return get_duration(f"{self.path}/{filename}.mp3")
+
     def call_tts(self, filename: str, text: str):
-        self.tts_module.run(text, filepath=f"{self.path}/{filename}.mp3")
-        # try:
-        #     self.length += MP3(f"{self.path}/{filename}.mp3").info.length
-        # except (MutagenError, HeaderNotFoundError):
-        #     self.length += sox.file_info.duration(f"{self.path}/{filename}.mp3")
-        try:
-            clip = AudioFileClip(f"{self.path}/{filename}.mp3")
-            self.last_clip_length = clip.duration
-            self.length += clip.duration
-            clip.close()
-        except:
-            self.length = 0
+        duration = self.synthesize(filename, text)
+        self.durations[filename] = duration
+        self.last_clip_length = duration
+        self.length += duration
 
 
 def process_text(text: str):
     lang = settings.config["reddit"]["thread"]["post_lang"]
     new_text = sanitize_text(text)
     if lang:
-        print_substep("Translating Text...")
-        translated_text = ts.google(text, to_language=lang)
+        translated_text = translate(text, lang)
         new_text = sanitize_text(translated_text)
     return new_text
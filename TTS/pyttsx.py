@@ -6,6 +6,7 @@ from utils import settings
 class pyttsx:
     def __init__(self):
         self.max_chars = 5000
+        self.max_workers = 1  # pyttsx3 drives a single native engine
         self.voices = []
 
     def run(
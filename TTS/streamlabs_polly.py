@@ -1,7 +1,7 @@
 import random
-import requests
 from requests.exceptions import JSONDecodeError
 from utils import settings
+from utils.sessions import pooled_session
 from utils.voice import check_ratelimit
 
 voices = [
@@ -30,7 +30,9 @@ class StreamlabsPolly:
     def __init__(self):
         self.url = "https://streamlabs.com/polly/speak"
         self.max_chars = 550
+        self.max_workers = 2
         self.voices = voices
+        self.session = pooled_session(pool_size=self.max_workers)
 
     def run(self, text, filepath, random_voice: bool = False):
         if random_voice:
@@ -42,13 +44,13 @@ class StreamlabsPolly:
                 )
             voice = str(settings.config["settings"]["tts"]["streamlabs_polly_voice"]).capitalize()
         body = {"voice": voice, "text": text, "service": "polly"}
-        response = requests.post(self.url, data=body)
+        response = self.session.post(self.url, data=body)
         if not check_ratelimit(response):
             self.run(text, filepath, random_voice)
 
         else:
             try:
-                voice_data = requests.get(response.json()["speak_url"])
+                voice_data = self.session.get(response.json()["speak_url"])
                 with open(filepath, "wb") as f:
                     f.write(voice_data.content)
             except (KeyError, JSONDecodeError):
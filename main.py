@@ -1,4 +1,5 @@
 #!/usr/bin/env python
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from subprocess import Popen
 from os import name
 import time
@@ -6,18 +7,25 @@ from prawcore import ResponseException
 
 from reddit.subreddit import get_subreddit_threads
 from utils.cleanup import cleanup
-from utils.console import print_markdown, print_step
+from utils.console import print_markdown, print_step, print_substep
 from utils import settings
 from utils.id import id
+from utils.pipeline import Pipeline
+from utils.profiler import profiler
 from utils.version import checkversion
+from utils.videos import claim
 
 from video_creation.background import (
     download_background,
     chop_background_video,
     get_background_config,
+    make_background_proxy,
+    refill_pool_in_background,
 )
+from video_creation.browser import browser_service
 from video_creation.final_video import make_final_video
 from video_creation.screenshot_downloader import download_screenshots_of_reddit_posts
+from video_creation.title_card import render_title_card
 from video_creation.voices import save_text_to_mp3
 
 __VERSION__ = "2.4.2"
@@ -39,20 +47,75 @@ print_markdown(
 checkversion(__VERSION__)
 
 
-def main(POST_ID=None):
-    reddit_object = get_subreddit_threads(POST_ID)
+def main(POST_ID=None, reddit_object=None):
+    profiler.reset()
+    stage = profiler.wrap  # a no-op unless settings.profiling is on
+    if settings.config["settings"]["title_card"] == "screenshot":
+        browser_service().warm(settings.config["settings"]["theme"])  # while the post is fetched
+    pipeline = Pipeline()
+    pipeline.add("fetch", stage("fetch", lambda: reddit_object or get_subreddit_threads(POST_ID)))
+    pipeline.add("id", set_redditid, "fetch")
+    pipeline.add("tts", stage("tts", save_text_to_mp3), "fetch")
+    pipeline.add("screenshots", stage("screenshots", take_screenshots), "fetch")
+    pipeline.add("background", stage("background", get_background_config))
+    pipeline.add("download", stage("download", download), "background")
+    pipeline.add("chop", stage("chop", chop), "fetch", "tts", "background", "download")
+    render_video = stage("render", render)
+    pipeline.add("render", render_video, "fetch", "tts", "background", "screenshots", "chop")
+    results = pipeline.run()
+    pipeline.print_summary()
+    profiler.report(results["id"])
+    # replaces the segment this video used, while the next post is fetched
+    refill_pool_in_background(results["background"][0])
+
+
+def set_redditid(reddit_object):
     global redditid
     redditid = id(reddit_object)
-    length, number_of_comments = save_text_to_mp3(reddit_object)
-    # length = math.ceil(length)
-    download_screenshots_of_reddit_posts(reddit_object, number_of_comments)
-    bg_config, logo_path, animation_path = get_background_config()
+    return redditid
+
+
+def take_screenshots(reddit_object):
+    # The TTS engine doesn't read comments (its comment loop is disabled), so no comment screenshots
+    # are needed and this stage doesn't have to wait for the audio to know how many to take.
+    # That leaves the title, which can also be drawn without a browser.
+    if settings.config["settings"]["title_card"] == "render":
+        render_title_card(reddit_object)
+    else:
+        download_screenshots_of_reddit_posts(reddit_object, 0)
+
+
+def download(background_config):
+    bg_config, _, _ = background_config
     download_background(bg_config)
+    make_background_proxy(bg_config)
+
+
+def chop(reddit_object, tts, background_config, _):
+    length, _ = tts
+    bg_config, _, _ = background_config
     chop_background_video(bg_config, length, reddit_object)
+
+
+def render(reddit_object, tts, background_config, *_):
+    length, number_of_comments = tts
+    bg_config, logo_path, animation_path = background_config
     make_final_video(number_of_comments, length, reddit_object, bg_config, logo_path, animation_path)
 
 
 def run_many(times):
+    workers = settings.config["settings"]["batch_workers"]
+    # A post_id in the config is picked every time, and workers sharing a post would render into
+    # (and clean up) the same temp folder, so that case runs one after the other
+    if workers > 1 and times > 1 and not settings.config["reddit"]["thread"]["post_id"]:
+        # Picked here, one after the other, so that no two jobs end up with the same post
+        reddit_objects = []
+        for _ in range(times):
+            reddit_object = get_subreddit_threads(None)
+            claim(reddit_object["thread_id"])
+            reddit_objects.append(reddit_object)
+        run_batch(reddit_objects, workers)
+        return
     for x in range(1, times + 1):
         print_step(
             f'On the {x}{("th", "st", "nd", "rd", "th", "th", "th", "th", "th", "th")[x % 10]} iteration of {times}.'
@@ -62,6 +125,39 @@ def run_many(times):
             Popen("cls" if name == "nt" else "clear", shell=True).wait()
 
 
+def run_batch(jobs: list, workers: int):
+    """Renders several posts at the same time in a pool of worker processes.
+
+    Args:
+        jobs (list): Post ids, or reddit objects that were already fetched
+        workers (int): Number of posts rendered at once
+    """
+    print_step(f"Rendering {len(jobs)} posts, {workers} at a time")
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=init_worker, initargs=(settings.config,)
+    ) as executor:
+        futures = {executor.submit(run_job, job): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            post = job["thread_id"] if isinstance(job, dict) else job
+            try:
+                future.result()
+                print_substep(f"Finished the video of {post}", style="bold green")
+            except Exception as error:  # one failed post shouldn't stop the others
+                print_substep(f"Failed to make the video of {post}: {error}", style="bold red")
+
+
+def init_worker(config: dict):
+    settings.config = config
+
+
+def run_job(job):
+    if isinstance(job, dict):
+        main(reddit_object=job)
+    else:
+        main(job)
+
+
 def shutdown():
     print_markdown("## Clearing temp files")
     try:
@@ -69,17 +165,19 @@ def shutdown():
     except NameError:
         print("Exiting...\n")
     else:
-        cleanup()
+        cleanup(redditid)
         print("Exiting...\n")
 
 if __name__ == "__main__":
     config = settings.check_toml("utils/.config.template.toml", "config.toml")
     config is False and exit()
     try:
-        if config["settings"]["times_to_run"]:
-            run_many(config["settings"]["times_to_run"])
+        post_ids = config["reddit"]["thread"]["post_id"].split("+")
+        if len(post_ids) > 1 and config["settings"]["batch_workers"] > 1:
+            # a post listed twice would be rendered by two workers in the same temp folder
+            run_batch(list(dict.fromkeys(post_ids)), config["settings"]["batch_workers"])
 
-        elif len(config["reddit"]["thread"]["post_id"].split("+")) > 1:
+        elif len(post_ids) > 1:
             for index, post_id in enumerate(config["reddit"]["thread"]["post_id"].split("+")):
                 index += 1
                 print_step(
@@ -87,6 +185,8 @@ if __name__ == "__main__":
                 )
                 main(post_id)
                 Popen("cls" if name == "nt" else "clear", shell=True).wait()
+        elif config["settings"]["times_to_run"]:
+            run_many(config["settings"]["times_to_run"])
         else:
             main()
             
@@ -1,4 +1,6 @@
+import os
 import re
+from collections import deque
 
 from prawcore.exceptions import ResponseException
 
@@ -7,19 +9,29 @@ import praw
 from praw.models import MoreComments
 
 from utils.console import print_step, print_substep
-from utils.subreddit import get_subreddit_undone
+from utils.subreddit import CandidateQueue
 from utils.videos import check_done
 from utils.voice import sanitize_text
 
 
-def get_subreddit_threads(POST_ID: str):
-    """
-    Returns a list of threads from the AskReddit subreddit.
-    """
+COMMENT_PAGE_SIZE = 50  # top-level comments fetched per request
+WORDS_PER_SECOND = 2.5  # rough speed of the TTS voices, to estimate how long a comment is read
+
+# One client and one candidate queue per process, so the login and the listings aren't redone for
+# every video
+reddit = None
+reddit_pid = None  # a forked batch worker must not reuse the client (and queues) of its parent
+candidates = {}  # subreddit name -> CandidateQueue
 
+
+def get_reddit() -> praw.Reddit:
+    """Logs into Reddit the first time it's called, and returns the same client after that."""
+    global reddit, reddit_pid
+    if reddit is not None and reddit_pid == os.getpid():
+        return reddit
+    candidates.clear()
     print_substep("Logging into Reddit.")
 
-    content = {}
     if settings.config["reddit"]["creds"]["2fa"]:
         print("\nEnter your two-factor authentication code from your authenticator app.\n")
         code = input("> ")
@@ -46,41 +58,69 @@ def get_subreddit_threads(POST_ID: str):
                 print("Invalid credentials - please check them in config.toml")
     except:
         print("Something went wrong...")
+    reddit_pid = os.getpid()
+    return reddit
 
-    # Ask user for subreddit input
-    print_step("Getting subreddit threads...")
+
+def read_only_reddit() -> praw.Reddit:
+    """A new client with the app credentials only, for reading listings in another thread."""
+    return praw.Reddit(
+        client_id=settings.config["reddit"]["creds"]["client_id"],
+        client_secret=settings.config["reddit"]["creds"]["client_secret"],
+        user_agent="Accessing Reddit threads",
+        check_for_async=False,
+    )
+
+
+def get_subreddit_name() -> str:
+    """The subreddit(s) from the config, asked for once when there isn't one."""
     if not settings.config["reddit"]["thread"][
         "subreddit"
     ]:  # note to user. you can have multiple subreddits via reddit.subreddit("redditdev+learnpython")
-        try:
-            subreddit = reddit.subreddit(
-                re.sub(r"r\/", "", input("What subreddit would you like to pull from? "))
-                # removes the r/ from the input
-            )
-        except ValueError:
-            subreddit = reddit.subreddit("askreddit")
+        subreddit_choice = re.sub(
+            r"r\/", "", input("What subreddit would you like to pull from? ")
+        )  # removes the r/ from the input
+        if not subreddit_choice:
+            subreddit_choice = "askreddit"
             print_substep("Subreddit not defined. Using AskReddit.")
-    else:
-        sub = settings.config["reddit"]["thread"]["subreddit"]
-        print_substep(f"Using subreddit: r/{sub} from TOML config")
-        subreddit_choice = sub
-        if str(subreddit_choice).casefold().startswith("r/"):  # removes the r/ from the input
-            subreddit_choice = subreddit_choice[2:]
-        subreddit = reddit.subreddit(subreddit_choice)
+        settings.config["reddit"]["thread"]["subreddit"] = subreddit_choice
+        return subreddit_choice
+    sub = settings.config["reddit"]["thread"]["subreddit"]
+    print_substep(f"Using subreddit: r/{sub} from TOML config")
+    subreddit_choice = sub
+    if str(subreddit_choice).casefold().startswith("r/"):  # removes the r/ from the input
+        subreddit_choice = subreddit_choice[2:]
+    return subreddit_choice
+
+
+def get_subreddit_threads(POST_ID: str):
+    """
+    Returns a list of threads from the AskReddit subreddit.
+    """
 
+    reddit = get_reddit()
+    content = {}
+
+    print_step("Getting subreddit threads...")
+    submission = None
     if POST_ID:  # would only be called if there are multiple queued posts
-        submission = reddit.submission(id=POST_ID)
+        submission = sort_comments(reddit.submission(id=POST_ID))
     elif (
         settings.config["reddit"]["thread"]["post_id"]
         and len(str(settings.config["reddit"]["thread"]["post_id"]).split("+")) == 1
     ):
-        submission = reddit.submission(id=settings.config["reddit"]["thread"]["post_id"])
-    else:
-        threads = subreddit.hot(limit=25)
-        submission = get_subreddit_undone(threads, subreddit)
-    submission = check_done(submission)  # double-checking
+        post_id = settings.config["reddit"]["thread"]["post_id"]
+        submission = sort_comments(reddit.submission(id=post_id))
+    if submission is not None:
+        submission = check_done(submission)
     if submission is None or not submission.num_comments:
-        return get_subreddit_threads(POST_ID)  # submission already done. rerun
+        subreddit_choice = get_subreddit_name()
+        if subreddit_choice not in candidates:
+            candidates[subreddit_choice] = CandidateQueue(read_only_reddit, subreddit_choice)
+        submission = candidates[subreddit_choice].pop()
+        if submission is None:
+            raise RuntimeError(f"Every post of r/{subreddit_choice} has already been done")
+        sort_comments(submission)
     upvotes = submission.score
     ratio = submission.upvote_ratio * 100
     num_comments = submission.num_comments
@@ -94,30 +134,62 @@ def get_subreddit_threads(POST_ID: str):
     content["thread_title"] = submission.title
     content["thread_post"] = submission.selftext
     content["thread_id"] = submission.id
+    content["subreddit"] = submission.subreddit.display_name
+    content["score"] = submission.score
+    content["author"] = submission.author.name if submission.author else "[deleted]"
     content["comments"] = []
 
-    for top_level_comment in submission.comments:
-        if isinstance(top_level_comment, MoreComments):
-            continue
-        if top_level_comment.body in ["[removed]", "[deleted]"]:
-            continue  # # see https://github.com/JasonLovesDoggo/RedditVideoMakerBot/issues/78
-        if not top_level_comment.stickied:
-            sanitised = sanitize_text(top_level_comment.body)
-            if not sanitised or sanitised == " ":
-                continue
-            if len(top_level_comment.body) <= int(
-                settings.config["reddit"]["thread"]["max_comment_length"]
-            ):
-                if (
-                    top_level_comment.author is not None
-                    and sanitize_text(top_level_comment.body) is not None
-                ):  # if errors occur with this change to if not.
-                    content["comments"].append(
-                        {
-                            "comment_body": top_level_comment.body,
-                            "comment_url": top_level_comment.permalink,
-                            "comment_id": top_level_comment.id,
-                        }
-                    )
+    for comment in stream_comments(submission):
+        content["comments"].append(
+            {
+                "comment_body": comment.body,
+                "comment_url": comment.permalink,
+                "comment_id": comment.id,
+            }
+        )
     print_substep("Received subreddit threads Successfully.", style="bold green")
     return content
+
+
+def sort_comments(submission):
+    """Sets the comment order and page size of a submission. praw only uses them for its first
+    fetch, so this has to happen before any attribute of a lazy submission is read."""
+    thread = settings.config["reddit"]["thread"]
+    submission.comment_sort = thread.get("comment_sort", "top")
+    submission.comment_limit = COMMENT_PAGE_SIZE
+    return submission
+
+
+def stream_comments(submission):
+    """Yields the usable top-level comments of a submission, in the reddit.thread.comment_sort
+    order, until they add up to about reddit.thread.comment_time_budget seconds of speech.
+    The submission must have gone through sort_comments.
+
+    Comments are fetched COMMENT_PAGE_SIZE at a time and "load more comments" placeholders are only
+    expanded once the comments before them have been used, so a huge thread costs no more than a
+    small one.
+    """
+    thread = settings.config["reddit"]["thread"]
+    max_comment_length = int(thread["max_comment_length"])
+    budget = thread.get("comment_time_budget", 50)
+    pending = deque(submission.comments)
+    spoken = 0.0
+    while pending and spoken < budget:
+        comment = pending.popleft()
+        if isinstance(comment, MoreComments):
+            pending.extend(
+                more
+                # comments() links every child, nested "load more" ones included, to the submission
+                for more in comment.comments()
+                if more.parent_id == submission.fullname  # only the top-level ones
+            )
+            continue
+        if comment.body in ["[removed]", "[deleted]"]:
+            continue  # # see https://github.com/JasonLovesDoggo/RedditVideoMakerBot/issues/78
+        if comment.stickied or comment.author is None or len(comment.body) > max_comment_length:
+            continue
+        sanitised = sanitize_text(comment.body)
+        if not sanitised or sanitised == " ":
+            continue
+        spoken += len(sanitised.split()) / WORDS_PER_SECOND
+        yield comment
@@ -0,0 +1,64 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+
+class StubServer(ThreadingHTTPServer):
+    """A local HTTP/1.1 server whose responses come from handle(handler), counting the client
+    connections it accepts."""
+
+    daemon_threads = True
+
+    def __init__(self, handle):
+        self.handle = handle
+        self.connections = 0
+        self.requests = []
+        super().__init__(("127.0.0.1", 0), StubHandler)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_GET(self):
+        self.body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.requests.append(self)
+        self.server.handle(self)
+
+    do_POST = do_GET
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status: int, body: bytes = b"", headers: dict = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def stub_server():
+    """Starts StubServer(handle) on a free port, stopped at the end of the test."""
+    servers = []
+
+    def start(handle) -> StubServer:
+        server = StubServer(handle)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
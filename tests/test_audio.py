@@ -0,0 +1,49 @@
+import subprocess
+
+import pytest
+
+moviepy_config = pytest.importorskip("moviepy.config")
+
+from utils import audio
+
+LENGTH = 2.5
+
+
+def encode(path, *options: str) -> str:
+    binary = moviepy_config.get_setting("FFMPEG_BINARY")
+    subprocess.run(
+        [binary, "-y", "-loglevel", "error", "-f", "lavfi", "-i", f"sine=duration={LENGTH}",
+         *options, str(path)],
+        check=True,
+    )  # fmt: skip
+    return str(path)
+
+
+@pytest.mark.parametrize(
+    "name, options",
+    [
+        ("vbr.mp3", ["-q:a", "4"]),  # Xing tag after an ID3 tag
+        ("cbr.mp3", ["-b:a", "64k", "-write_xing", "0", "-id3v2_version", "0"]),  # frames counted
+        ("mono.mp3", ["-ac", "1", "-ar", "22050", "-b:a", "32k", "-write_xing", "0"]),
+    ],
+)
+def test_mp3_is_read_from_its_headers(tmp_path, monkeypatch, name, options):
+    path = encode(tmp_path / name, *options)
+    monkeypatch.setattr(audio, "ffmpeg_duration", lambda path: pytest.fail("probed with ffmpeg"))
+    # the encoder adds up to a frame of padding at each end
+    assert audio.get_duration(path) == pytest.approx(LENGTH, abs=0.08)
+
+
+def test_wav_is_read_from_its_header(tmp_path, monkeypatch):
+    path = encode(tmp_path / "voice.wav")
+    monkeypatch.setattr(audio, "ffmpeg_duration", lambda path: pytest.fail("probed with ffmpeg"))
+    assert audio.get_duration(path) == pytest.approx(LENGTH, abs=0.001)
+
+
+@pytest.mark.parametrize("name", ["voice.aiff", "voice.m4a", "voice.ogg"])
+def test_other_formats_are_probed_with_ffmpeg(tmp_path, name):
+    path = encode(tmp_path / name)
+    with pytest.raises(ValueError):
+        with open(path, "rb") as audio_file:
+            audio._mp3_duration(audio_file.read())
+    assert audio.get_duration(path) == pytest.approx(LENGTH, abs=0.05)
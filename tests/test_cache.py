@@ -0,0 +1,54 @@
+import json
+
+from utils.cache import FileCache
+
+
+def store(cache: FileCache, tmp_path, key: str, size: int):
+    src = tmp_path / f"{key}.src"
+    src.write_bytes(b"x" * size)
+    cache.put(key, str(src))
+
+
+def index(directory) -> dict:
+    return json.loads((directory / "index.json").read_text())
+
+
+def test_processes_keep_each_others_entries(tmp_path):
+    directory = tmp_path / "cache"
+    first, second = FileCache(str(directory), 1), FileCache(str(directory), 1)
+    store(first, tmp_path, "a", 100)
+    store(second, tmp_path, "b", 100)
+    store(first, tmp_path, "c", 100)
+    assert set(index(directory)) == {"a", "b", "c"}
+    assert FileCache(str(directory), 1).get("a", str(tmp_path / "a.out")) == {}
+
+
+def test_size_cap_holds_across_processes(tmp_path):
+    directory = tmp_path / "cache"
+    first, second = FileCache(str(directory), 0.001), FileCache(str(directory), 0.001)
+    store(first, tmp_path, "a", 400)
+    store(second, tmp_path, "b", 400)
+    store(first, tmp_path, "c", 400)
+    assert set(index(directory)) == {"b", "c"}
+    assert sorted(path.name for path in directory.iterdir()) == ["b", "c", "index.json"]
+
+
+def test_hits_are_saved_on_flush(tmp_path):
+    directory = tmp_path / "cache"
+    cache = FileCache(str(directory), 1)
+    store(cache, tmp_path, "a", 100)
+    saved = index(directory)["a"]["last_used"]
+    assert cache.get("a", str(tmp_path / "a.out")) == {}
+    assert index(directory)["a"]["last_used"] == saved
+    cache.flush()
+    assert index(directory)["a"]["last_used"] > saved
+
+
+def test_missing_file_is_a_miss(tmp_path):
+    directory = tmp_path / "cache"
+    cache = FileCache(str(directory), 1)
+    store(cache, tmp_path, "a", 100)
+    cache.path("a").unlink()
+    assert cache.get("a", str(tmp_path / "a.out")) is None
+    cache.flush()
+    assert index(directory) == {}
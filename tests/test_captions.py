@@ -0,0 +1,32 @@
+from PIL import Image
+
+from utils import settings
+from video_creation import captions
+
+
+def fake_from_string(html, path, css, options):
+    """Draws every line as a block of its own color, with the separator bars between them."""
+    lines = html.split(captions.SEPARATOR)
+    atlas = Image.new("RGB", (100, 30 * len(lines) - 6), captions.SEPARATOR_COLOR)
+    for index, line in enumerate(lines):
+        color = (len(line) * 7 % 256, 40, 80)
+        atlas.paste(Image.new("RGB", (100, 24), color), (0, 30 * index))
+    atlas.save(path)
+
+
+def test_a_new_render_leaves_the_cached_image_alone(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(settings, "config", {"captions": {"cache_size": 10}}, False)
+    monkeypatch.setattr(captions.imgkit, "from_string", fake_from_string)
+    css = tmp_path / "theme.css"
+    css.write_text("span {}")
+    path = str(tmp_path / "post.part0.png")
+
+    captions.render_captions(["first"], [path], str(css), {})
+    first = Image.open(path).getpixel((0, 0))
+    # a retry after a crash, with the same temp folder but another text
+    captions.render_captions(["a second line"], [path], str(css), {})
+    assert Image.open(path).getpixel((0, 0)) != first
+
+    captions.render_captions(["first"], [path], str(css), {})
+    assert Image.open(path).getpixel((0, 0)) == first
@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import re
+
+import pytest
+
+from utils.download import DownloadError, download_file, download_lock
+
+DATA = bytes(range(256)) * 4096  # 1 MiB, no two neighbouring chunks alike
+
+
+def serve_ranges(data: bytes):
+    def handle(handler):
+        match = re.fullmatch(r"bytes=(\d+)-(\d+)", handler.headers.get("Range", ""))
+        if match is None:
+            handler.reply(200, data)
+            return
+        start, end = int(match[1]), int(match[2])
+        handler.reply(
+            206,
+            data[start : end + 1],
+            {"Content-Range": f"bytes {start}-{end}/{len(data)}"},
+        )
+
+    return handle
+
+
+def test_downloads_in_parallel_ranges(stub_server, tmp_path):
+    server = stub_server(serve_ranges(DATA))
+    path = tmp_path / "background.mp4"
+
+    download_file(server.url, str(path), len(DATA), hashlib.sha256(DATA).hexdigest(), workers=4)
+
+    assert path.read_bytes() == DATA
+    assert len(server.requests) == 4
+    assert not (tmp_path / "background.mp4.part").exists()
+    assert not (tmp_path / "background.mp4.part.json").exists()
+    assert not (tmp_path / "background.mp4.lock").exists()
+
+
+def test_resumes_from_the_saved_progress(stub_server, tmp_path):
+    server = stub_server(serve_ranges(DATA))
+    path = tmp_path / "background.mp4"
+    half = len(DATA) // 2
+    # what an interrupted download leaves behind: the first half received, the rest still zeros
+    (tmp_path / "background.mp4.part").write_bytes(DATA[:half] + bytes(len(DATA) - half))
+    (tmp_path / "background.mp4.part.json").write_text(
+        json.dumps({"url": server.url, "size": len(DATA), "ranges": [[half, len(DATA)]]})
+    )
+
+    download_file(server.url, str(path), len(DATA), hashlib.sha256(DATA).hexdigest())
+
+    assert path.read_bytes() == DATA
+    assert [request.headers["Range"] for request in server.requests] == [
+        f"bytes={half}-{len(DATA) - 1}"
+    ]
+
+
+def test_server_without_range_support_fails(stub_server, tmp_path):
+    server = stub_server(lambda handler: handler.reply(200, DATA))
+    path = tmp_path / "background.mp4"
+
+    with pytest.raises(DownloadError):
+        download_file(server.url, str(path), len(DATA))
+
+    assert not path.exists()
+
+
+def test_hash_mismatch_removes_the_download(stub_server, tmp_path):
+    server = stub_server(serve_ranges(DATA))
+    path = tmp_path / "background.mp4"
+
+    with pytest.raises(DownloadError):
+        download_file(server.url, str(path), len(DATA), hashlib.sha256(b"other").hexdigest())
+
+    assert not path.exists()
+    assert not (tmp_path / "background.mp4.part").exists()
+    assert not (tmp_path / "background.mp4.part.json").exists()
+
+
+def test_lock_taken_over_is_left_to_its_new_owner(tmp_path):
+    path = str(tmp_path / "background.mp4")
+
+    with download_lock(path) as lock_path:
+        # another process decides the lock is stale and takes it over
+        os.unlink(lock_path)
+        with open(lock_path, "wb") as lock_file:
+            lock_file.write(b"other-owner")
+
+    with open(lock_path, "rb") as lock_file:
+        assert lock_file.read() == b"other-owner"
@@ -0,0 +1,129 @@
+import subprocess
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+moviepy_config = pytest.importorskip("moviepy.config")
+from moviepy.audio.io.AudioFileClip import AudioFileClip
+from moviepy.video.io.VideoFileClip import VideoFileClip
+
+from utils import settings
+from video_creation.animation import keyed_animation
+from video_creation.ffmpeg_render import FPS, H, W, render_ffmpeg
+from video_creation.moviepy_render import compose_with_moviepy
+
+ID = "fixture"
+VOICE_LENGTHS = [1.0, 1.2]
+LENGTH = sum(VOICE_LENGTHS)
+OPACITY = 0.9
+TRANSITION = 0.2
+MIN_PSNR = 30  # dB, the backends differ by scaling filters and yuv rounding, not by layout
+SAMPLES = [0.1, 0.5, 0.95, 1.3, 1.6, 2.1]  # seconds, inside and across the caption change
+
+
+def ffmpeg(*args: str):
+    binary = moviepy_config.get_setting("FFMPEG_BINARY")
+    subprocess.run([binary, "-y", "-loglevel", "error", *args], check=True)
+
+
+def draw(path, size, color, text):
+    image = Image.new("RGBA", size, (0, 0, 0, 0))
+    ImageDraw.Draw(image).rounded_rectangle([0, 0, size[0] - 1, size[1] - 1], 20, fill=color)
+    ImageDraw.Draw(image).text((20, 20), text, fill=(255, 255, 255, 255))
+    image.save(path)
+
+
+@pytest.fixture
+def timeline(tmp_path, monkeypatch):
+    """A short timeline with everything a real one has: background, two captions, a logo, a
+    keyed animation and a voice clip per caption."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(settings, "config", {"settings": {"profiling": False}}, False)
+    temp = tmp_path / "assets" / "temp" / ID
+    temp.mkdir(parents=True)
+
+    ffmpeg(
+        "-f", "lavfi", "-i", f"testsrc2=size={W}x{H}:rate={FPS}:duration={LENGTH + 0.5}",
+        "-c:v", "libx264", "-pix_fmt", "yuv420p", str(temp / "background.mp4"),
+    )  # fmt: skip
+    ffmpeg(
+        "-f", "lavfi", "-i", "color=c=0x40de00:size=240x240:rate=30:duration=1",
+        "-vf", "drawbox=x=60+t*60:y=60:w=80:h=80:color=red:t=fill",
+        "-c:v", "libx264", "-pix_fmt", "yuv420p", "-crf", "0", str(tmp_path / "animation.mp4"),
+    )  # fmt: skip
+    audio_files = []
+    for index, length in enumerate(VOICE_LENGTHS):
+        audio_files.append(str(temp / f"voice{index}.wav"))
+        ffmpeg(
+            "-f", "lavfi", "-i", f"sine=frequency={440 * (index + 1)}:duration={length}",
+            "-ar", "44100", audio_files[-1],
+        )  # fmt: skip
+
+    images = []
+    for index, length in enumerate(VOICE_LENGTHS):
+        path = str(temp / f"caption{index}.png")
+        draw(path, (480, 160), (30, 30, 120 * index + 60, 230), f"caption {index}")
+        images.append(
+            {"path": path, "duration": length, "width": 980, "margin_bottom": 0, "margin_right": 0}
+        )
+    draw(str(temp / "logo.png"), (200, 200), (200, 120, 20, 255), "logo")
+    logo = {"path": str(temp / "logo.png"), "duration": LENGTH, "height": 400, "top": 300,
+            "fadein": 0.5}  # fmt: skip
+    animation = {
+        "path": keyed_animation(str(tmp_path / "animation.mp4"), 360),
+        "start": LENGTH - 1,
+        "margin_bottom": 300,
+        "margin_right": 0,
+    }
+    return audio_files, images, logo, animation
+
+
+def render_both(tmp_path, timeline):
+    audio_files, images, logo, animation = timeline
+    ffmpeg_output = str(tmp_path / "ffmpeg.mp4")
+    render_ffmpeg(
+        f"assets/temp/{ID}/background.mp4",
+        audio_files,
+        images,
+        logo,
+        animation,
+        OPACITY,
+        TRANSITION,
+        LENGTH,
+        ffmpeg_output,
+        str(tmp_path / "filtergraph.txt"),
+    )
+    moviepy_output = str(tmp_path / "moviepy.mp4")
+    final = compose_with_moviepy(ID, audio_files, images, logo, animation, OPACITY, TRANSITION)
+    final.set_duration(LENGTH).write_videofile(
+        moviepy_output,
+        fps=FPS,
+        codec="libx264",
+        audio_codec="aac",
+        audio_bitrate="192k",
+        temp_audiofile=str(tmp_path / "audio.mp4"),
+        logger=None,
+    )
+    return ffmpeg_output, moviepy_output
+
+
+def psnr(first: np.ndarray, second: np.ndarray) -> float:
+    error = np.mean((first.astype(np.float64) - second.astype(np.float64)) ** 2)
+    return float("inf") if error == 0 else 10 * np.log10(255**2 / error)
+
+
+def test_backends_render_the_same_video(tmp_path, timeline):
+    ffmpeg_output, moviepy_output = render_both(tmp_path, timeline)
+
+    with VideoFileClip(ffmpeg_output) as rendered, VideoFileClip(moviepy_output) as reference:
+        assert tuple(rendered.size) == tuple(reference.size) == (W, H)
+        assert rendered.duration == pytest.approx(LENGTH, abs=2 / FPS)
+        assert reference.duration == pytest.approx(LENGTH, abs=2 / FPS)
+        for t in SAMPLES:
+            score = psnr(rendered.get_frame(t), reference.get_frame(t))
+            assert score > MIN_PSNR, f"frame at {t}s differs, PSNR {score:.1f} dB"
+
+    for output in (ffmpeg_output, moviepy_output):
+        with AudioFileClip(output) as audio:
+            assert audio.duration == pytest.approx(LENGTH, abs=0.1)
@@ -0,0 +1,30 @@
+from utils.sessions import pooled_session
+
+
+def test_requests_reuse_one_connection(stub_server):
+    server = stub_server(lambda handler: handler.reply(200, b"ok"))
+    session = pooled_session(pool_size=2)
+
+    for _ in range(5):
+        assert session.get(server.url).text == "ok"
+
+    assert server.connections == 1
+
+
+def test_unavailable_response_is_retried(stub_server):
+    statuses = [503, 200]
+    server = stub_server(lambda handler: handler.reply(statuses.pop(0), b"done"))
+    session = pooled_session(retries=2, backoff_factor=0.01)
+
+    response = session.post(server.url, json={"text": "hello"})
+
+    assert response.status_code == 200
+    assert len(server.requests) == 2
+
+
+def test_last_response_is_returned_once_retries_run_out(stub_server):
+    server = stub_server(lambda handler: handler.reply(503))
+    session = pooled_session(retries=1, backoff_factor=0.01)
+
+    assert session.get(server.url).status_code == 503
+    assert len(server.requests) == 2
@@ -0,0 +1,41 @@
+import threading
+from types import SimpleNamespace
+
+from utils import settings
+from utils import subreddit
+
+
+class FakeReddit:
+    """Serves listings of fake posts and records which thread used which client."""
+
+    uses = []
+
+    def subreddit(self, name):
+        def listing(kind):
+            FakeReddit.uses.append((self, threading.get_ident()))
+            return [
+                SimpleNamespace(id=f"{name}-{kind}", score=len(kind)),
+                SimpleNamespace(id="shared", score=100),
+            ]
+
+        return SimpleNamespace(
+            hot=lambda limit: listing("hot"),
+            top=lambda time_filter, limit: listing(time_filter),
+        )
+
+
+def test_listings_are_merged_ranked_and_fetched_with_their_own_client(monkeypatch):
+    monkeypatch.setattr(settings, "config", {"reddit": {"thread": {"rank_by": "score"}}}, False)
+    monkeypatch.setattr(subreddit, "is_eligible", lambda submission: True)
+    FakeReddit.uses = []
+
+    queue = subreddit.CandidateQueue(FakeReddit, "first+second")
+    popped = []
+    while (submission := queue.pop()) is not None:
+        popped.append(submission.id)
+
+    listings = 2 * (1 + len(subreddit.VALID_TIME_FILTERS))
+    assert len(FakeReddit.uses) == listings
+    assert len({id(client) for client, _ in FakeReddit.uses}) == listings
+    assert popped[0] == "shared"  # highest score, and only once
+    assert len(popped) == listings + 1
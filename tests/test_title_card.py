@@ -0,0 +1,42 @@
+import pytest
+from PIL import Image
+
+from utils import settings
+from video_creation import title_card
+
+POST = {
+    "thread_id": "abc123",
+    "thread_title": "What’s the one thing you’d tell your younger self? — “anything”",
+    "subreddit": "AskReddit",
+    "author": "someone",
+    "score": 1234,
+}
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    config = {
+        "settings": {"theme": "dark", "title_font": ""},
+        "reddit": {"thread": {"post_lang": ""}},
+    }
+    monkeypatch.setattr(settings, "config", config, False)
+    title_card.load_font.cache_clear()
+    yield config
+    title_card.load_font.cache_clear()
+
+
+def test_missing_font_is_a_clear_error(config, monkeypatch):
+    monkeypatch.setattr(title_card, "FALLBACK_FONTS", ["no-such-font.ttf"])
+    with pytest.raises(RuntimeError, match="title_font"):
+        title_card.render_title_card(POST)
+
+
+def test_title_with_unicode_punctuation_is_drawn(config, tmp_path):
+    try:
+        title_card.load_font(title_card.TITLE_SIZE)
+    except RuntimeError:
+        pytest.skip("no TrueType font installed")
+    title_card.render_title_card(POST)
+    with Image.open(tmp_path / "assets/temp/abc123/png/title.png") as card:
+        assert card.width == title_card.WIDTH
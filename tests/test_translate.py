@@ -0,0 +1,27 @@
+import json
+
+from utils import settings
+from utils import translate
+
+
+def test_saves_keep_the_translations_of_other_processes(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "config", {"reddit": {"thread": {"post_lang": "fr"}}}, False)
+    monkeypatch.setattr(translate, "CACHE_PATH", str(tmp_path / "translations.json"))
+    monkeypatch.setattr(translate, "_cache", {})
+    monkeypatch.setattr(translate, "_loaded", False)
+    monkeypatch.setattr(
+        translate, "_translate_batch", lambda batch, lang: [f"{lang}:{text}" for text in batch]
+    )
+
+    assert translate.translate("hello") == "fr:hello"
+    # another batch worker saved a translation since this process loaded the file
+    with open(translate.CACHE_PATH, "w", encoding="utf-8") as cache_file:
+        json.dump({"fr": {"hello": "fr:hello", "cat": "chat"}, "de": {"cat": "Katze"}}, cache_file)
+    assert translate.translate("dog") == "fr:dog"
+
+    with open(translate.CACHE_PATH, "r", encoding="utf-8") as cache_file:
+        saved = json.load(cache_file)
+    assert saved == {
+        "fr": {"hello": "fr:hello", "dog": "fr:dog", "cat": "chat"},
+        "de": {"cat": "Katze"},
+    }
@@ -0,0 +1,144 @@
+import json
+import wave
+from pathlib import Path
+from typing import Dict
+
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+MANIFEST_NAME = "durations.json"
+MIN_FRAMES = 3  # frames in a row an MP3 has to start with, so other formats aren't taken for one
+
+# kbps, indexed by the 4 bitrate bits of the frame header. 0 is "free format", 15 is invalid.
+_BITRATES = {
+    (1, 1): [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    (1, 2): [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    (1, 3): [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    (2, 1): [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    (2, 2): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    (2, 3): [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 2.5: [11025, 12000, 8000]}
+_VERSIONS = {0: 2.5, 2: 2, 3: 1}
+_LAYERS = {1: 3, 2: 2, 3: 1}
+
+
+def get_duration(path: str) -> float:
+    """Returns the duration of an audio file in seconds.
+
+    MP3 and WAV files are measured from their headers without starting any process. Anything else
+    (or a file the header parser doesn't understand) is probed with moviepy's ffmpeg.
+
+    Args:
+        path (str): Path of the audio file
+
+    Returns:
+        float: Duration in seconds
+    """
+    with open(path, "rb") as audio_file:
+        data = audio_file.read()
+    try:
+        if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+            with wave.open(path, "rb") as wav:
+                return wav.getnframes() / wav.getframerate()
+        return _mp3_duration(data)
+    except (ValueError, IndexError, wave.Error, EOFError):
+        return ffmpeg_duration(path)
+
+
+def ffmpeg_duration(path: str) -> float:
+    duration = ffmpeg_parse_infos(path)["duration"]
+    if not duration:
+        raise ValueError(f"Can't read the duration of {path}")
+    return duration
+
+
+def _parse_frame_header(data: bytes, pos: int):
+    """Returns (version, layer, bitrate in bps, sample rate, padding, channel mode) or None."""
+    if pos + 4 > len(data) or data[pos] != 0xFF or data[pos + 1] & 0xE0 != 0xE0:
+        return None
+    version = _VERSIONS.get((data[pos + 1] >> 3) & 3)
+    layer = _LAYERS.get((data[pos + 1] >> 1) & 3)
+    bitrate_index = data[pos + 2] >> 4
+    sample_rate_index = (data[pos + 2] >> 2) & 3
+    if version is None or layer is None or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    bitrate = _BITRATES[(1 if version == 1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+    padding = (data[pos + 2] >> 1) & 1
+    channel_mode = data[pos + 3] >> 6
+    return version, layer, bitrate, sample_rate, padding, channel_mode
+
+
+def _samples_per_frame(version, layer) -> int:
+    if layer == 1:
+        return 384
+    if layer == 3 and version != 1:
+        return 576
+    return 1152
+
+
+def _frame_length(version, layer, bitrate, sample_rate, padding) -> int:
+    if layer == 1:
+        return (12 * bitrate // sample_rate + padding) * 4
+    return _samples_per_frame(version, layer) // 8 * bitrate // sample_rate + padding
+
+
+def _mp3_duration(data: bytes) -> float:
+    pos = 0
+    if data[:3] == b"ID3":  # skip the ID3v2 tag, its size is a 28 bit "syncsafe" integer
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        pos = 10 + size + (10 if data[5] & 0x10 else 0)
+    while pos < len(data) and data[pos] == 0:  # padding after the tag
+        pos += 1
+    # The audio has to start right here with a few valid frames, scanning further on would find
+    # sync words in the data of any other format
+    check = pos
+    for _ in range(MIN_FRAMES):
+        header = _parse_frame_header(data, check)
+        if header is None:
+            if check == len(data) and check > pos:  # a very short file
+                break
+            raise ValueError("The file doesn't start with MPEG audio frames")
+        version, layer, bitrate, sample_rate, padding, _ = header
+        check += _frame_length(version, layer, bitrate, sample_rate, padding)
+    header = _parse_frame_header(data, pos)
+    version, layer, _, sample_rate, _, channel_mode = header
+    samples = _samples_per_frame(version, layer)
+
+    # VBR encoders put the total frame count in a Xing/Info or VBRI tag inside the first frame
+    mono = channel_mode == 3
+    side_info = (17 if mono else 32) if version == 1 else (9 if mono else 17)
+    xing = pos + 4 + side_info
+    if data[xing : xing + 4] in (b"Xing", b"Info") and data[xing + 7] & 1:
+        frames = int.from_bytes(data[xing + 8 : xing + 12], "big")
+        return frames * samples / sample_rate
+    if data[pos + 36 : pos + 40] == b"VBRI":
+        frames = int.from_bytes(data[pos + 50 : pos + 54], "big")
+        return frames * samples / sample_rate
+
+    # No tag: count the frames. This only touches 4 bytes per frame.
+    frames = 0
+    while True:
+        header = _parse_frame_header(data, pos)
+        if header is None:
+            break
+        version, layer, bitrate, sample_rate, padding, _ = header
+        pos += _frame_length(version, layer, bitrate, sample_rate, padding)
+        frames += 1
+    if not frames:
+        raise ValueError("No MPEG audio frame found")
+    return frames * samples / sample_rate
+
+
+def load_manifest(directory: str) -> Dict[str, float]:
+    """Reads the clip durations recorded by the TTS engine for a post."""
+    try:
+        with open(Path(directory) / MANIFEST_NAME, "r", encoding="utf-8") as manifest:
+            return json.load(manifest)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(directory: str, durations: Dict[str, float]):
+    with open(Path(directory) / MANIFEST_NAME, "w", encoding="utf-8") as manifest:
+        json.dump(durations, manifest, indent=4)
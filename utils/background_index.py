@@ -0,0 +1,92 @@
+import json
+import os
+import shutil
+import subprocess
+import threading
+from pathlib import Path
+from typing import List
+
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+
+INDEX_PATH = "assets/backgrounds/index.json"
+
+lock = threading.Lock()
+
+
+def background_info(path: str) -> dict:
+    """Returns the duration, fps, width, height and keyframe timestamps of a background video.
+
+    The values are kept in assets/backgrounds/index.json and a file is only probed again when its
+    size or modification time changes, so most runs never open the video at all.
+
+    Args:
+        path (str): Path of the background video
+
+    Returns:
+        dict: duration, fps, width, height and keyframes (seconds, ascending) of the video
+    """
+    stat = os.stat(path)
+    with lock:
+        index = _load()
+        entry = index.get(str(path))
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            return entry
+    entry = {"size": stat.st_size, "mtime": stat.st_mtime, **probe(path)}
+    with lock:
+        index = _load()
+        index[str(path)] = entry
+        _save(index)
+    return entry
+
+
+def probe(path: str) -> dict:
+    infos = ffmpeg_parse_infos(path)
+    width, height = infos["video_size"]
+    return {
+        "duration": infos["duration"],
+        "fps": infos["video_fps"],
+        "width": width,
+        "height": height,
+        "keyframes": keyframes(path),
+    }
+
+
+def keyframes(path: str) -> List[float]:
+    """Timestamps of the keyframes of the first video stream, read from the packet flags without
+    decoding anything. Empty when ffprobe isn't installed."""
+    ffprobe = shutil.which("ffprobe")
+    if ffprobe is None:
+        return []
+    # fmt: off
+    output = subprocess.run(
+        [
+            ffprobe, "-v", "error", "-select_streams", "v:0",
+            "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", path,
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    # fmt: on
+    times = []
+    for line in output.splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" in flags and pts_time not in ("", "N/A"):
+            times.append(float(pts_time))
+    return sorted(times)
+
+
+def _load() -> dict:
+    try:
+        with open(INDEX_PATH, "r", encoding="utf-8") as index_file:
+            return json.load(index_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save(index: dict):
+    Path(INDEX_PATH).parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = f"{INDEX_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as index_file:
+        json.dump(index, index_file)
+    os.replace(tmp_path, INDEX_PATH)
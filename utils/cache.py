@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from utils.locks import locked
+
+SAVE_INTERVAL = 30  # seconds between two saves of the last_used times of cache hits
+
+
+def link_or_copy(src: str, dst: str):
+    """Hard-links src to dst, copying instead when linking isn't possible (other drive, FAT32...).
+
+    Anything already at dst is removed first, so a later write to dst can never reach through a
+    hard link into the cache.
+    """
+    Path(dst).unlink(missing_ok=True)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+class FileCache:
+    """A content-addressed file cache with least-recently-used eviction.
+
+    Every entry is a single file stored under its key, together with a small metadata dict in
+    index.json. Once the total size of the stored files goes over max_size_mb, the entries that
+    were used the longest time ago are removed.
+
+    Several processes can share a cache: index.json is re-read and merged with this instance's
+    changes under a lock every time it's saved. Stores are saved right away, the last_used times
+    of hits at most every SAVE_INTERVAL seconds and on flush.
+
+    Args:
+        directory       : Where the cached files and index.json are kept.
+        max_size_mb     : Size cap of the cache in megabytes.
+        suffix          : Extension given to the stored files.
+    """
+
+    def __init__(self, directory: str, max_size_mb: float, suffix: str = ""):
+        self.directory = Path(directory)
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.suffix = suffix
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.directory / "index.json"
+        self.index = self._read()
+        self.changed = set()  # keys stored or used since the last save
+        self.removed = set()  # keys whose file turned out to be gone
+        self.saved_at = time.time()
+
+    @staticmethod
+    def key(*parts) -> str:
+        """Builds a cache key out of everything that influences the cached file."""
+        return hashlib.sha256("\0".join(map(str, parts)).encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}{self.suffix}"
+
+    def get(self, key: str, dst: str) -> Optional[dict]:
+        """Places the cached file for key at dst.
+
+        Returns:
+            dict|None: The metadata stored with the entry, None on a cache miss
+        """
+        with self.lock:
+            entry = self.index.get(key)
+            try:
+                if entry is None:
+                    raise FileNotFoundError(key)
+                # another process may evict it at any time
+                link_or_copy(str(self.path(key)), dst)
+            except FileNotFoundError:
+                if entry is not None:
+                    del self.index[key]
+                    self.removed.add(key)
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry["last_used"] = time.time()
+            self.changed.add(key)
+            if time.time() - self.saved_at > SAVE_INTERVAL:
+                self._save()
+            return entry["meta"]
+
+    def put(self, key: str, src: str, **meta):
+        """Stores a copy of src under key, evicting old entries if the cache grows too big."""
+        with self.lock:
+            link_or_copy(src, str(self.path(key)))
+            self.index[key] = {
+                "size": self.path(key).stat().st_size,
+                "last_used": time.time(),
+                "meta": meta,
+            }
+            self.changed.add(key)
+            self.removed.discard(key)
+            self._save()
+
+    def flush(self):
+        """Saves the last_used times of the hits that haven't been saved yet."""
+        with self.lock:
+            if self.changed or self.removed:
+                self._save()
+
+    def stats(self) -> str:
+        return f"{self.hits} hits, {self.misses} misses"
+
+    def _evict(self):
+        total = sum(entry["size"] for entry in self.index.values())
+        for key in sorted(self.index, key=lambda k: self.index[k]["last_used"]):
+            if total <= self.max_size:
+                break
+            total -= self.index.pop(key)["size"]
+            self.path(key).unlink(missing_ok=True)
+
+    def _read(self) -> dict:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as index_file:
+                return json.load(index_file)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        """Merges this instance's changes into index.json, evicts, and writes it back."""
+        with locked(str(self.index_path)):
+            index = self._read()
+            for key in self.removed:
+                index.pop(key, None)
+            for key in self.changed:
+                # an entry evicted by another process since is only put back if its file is
+                if key in self.index and (key in index or self.path(key).is_file()):
+                    index[key] = self.index[key]
+            self.index = index
+            self.changed.clear()
+            self.removed.clear()
+            self._evict()
+            tmp_path = self.index_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as index_file:
+                json.dump(self.index, index_file)
+            os.replace(tmp_path, self.index_path)
+        self.saved_at = time.time()
@@ -3,11 +3,13 @@ from os.path import exists
 import shutil
 from utils.console import print_step, print_substep
 
-def cleanup():
-    """Deletes assets in assets/temp
+def cleanup(id: str = None):
+    """Deletes the assets of one post in assets/temp/<id>, or the whole of assets/temp if no id is
+    given. Only removing the post's own folder lets several posts be rendered side by side.
     """
-    temp_path = "./assets/temp"
+    temp_path = "./assets/temp" if id is None else f"./assets/temp/{id}"
     print_step("Removing temporary files 🗑")
+    file_count = 0
     if exists(temp_path):
         file_count = sum(len(files) for _, _, files in os.walk(temp_path))
         shutil.rmtree(temp_path)
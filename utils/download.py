@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from utils.console import print_substep
+from utils.sessions import pooled_session
+
+CHUNK_SIZE = 1024 * 1024
+PROGRESS_INTERVAL = 2  # seconds between two saves of the progress file
+STALE_AFTER = 60  # seconds without progress after which a download lock is taken over
+
+
+class DownloadError(Exception):
+    pass
+
+
+@contextmanager
+def download_lock(path: str):
+    """Makes sure a single process downloads path at a time.
+
+    The lock file is touched while the download makes progress, so a lock left over by a killed
+    process is taken over once it hasn't been touched for STALE_AFTER seconds. It holds the pid of
+    its owner (and a random token), so a lock that was taken over is never removed by the process
+    it was taken from.
+    """
+    lock_path = f"{path}.lock"
+    owner = f"{os.getpid()}-{uuid.uuid4().hex}".encode()
+    while True:
+        try:
+            lock = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.write(lock, owner)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lock_path) > STALE_AFTER:
+                    os.unlink(lock_path)
+            except FileNotFoundError:
+                pass
+            time.sleep(1)
+    try:
+        yield lock_path
+    finally:
+        os.close(lock)
+        try:
+            with open(lock_path, "rb") as lock_file:
+                if lock_file.read() == owner:
+                    os.unlink(lock_path)
+        except FileNotFoundError:
+            pass
+
+
+def download_file(
+    url: str,
+    path: str,
+    size: int,
+    sha256: Optional[str] = None,
+    workers: int = 1,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+):
+    """Downloads url to path, resuming where an earlier attempt stopped.
+
+    The data goes to path.part, and the bytes received for every range are saved to
+    path.part.json as the download goes. Only a complete file whose size (and sha256, when given)
+    matches is renamed to path, so a file at path is always a whole one.
+
+    Args:
+        url (str): What to download, the server has to support Range requests
+        path (str): Where to save it
+        size (int): Expected size in bytes
+        sha256 (str): Expected sha256 hex digest, not checked when None
+        workers (int): How many byte ranges are fetched at the same time
+        on_progress (Callable[[int, int], None]): Called with the bytes received and size
+    """
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with download_lock(path) as lock_path:
+        if Path(path).is_file():  # another process finished it while this one was waiting
+            return
+        part_path = f"{path}.part"
+        progress_path = f"{part_path}.json"
+        ranges = _load_progress(progress_path, size, workers)
+        if not Path(part_path).is_file() or os.path.getsize(part_path) != size:
+            ranges = _split(size, workers)
+            with open(part_path, "wb") as part:
+                part.truncate(size)
+        if any(start < end for start, end in ranges):
+            received = size - sum(end - start for start, end in ranges)
+            if received:
+                print_substep(f"Resuming the download at {received / size:.0%}")
+            _fetch(url, part_path, progress_path, lock_path, size, ranges, on_progress)
+        _verify(part_path, size, sha256)
+        os.replace(part_path, path)
+        Path(progress_path).unlink(missing_ok=True)
+
+
+def _split(size: int, workers: int) -> List[List[int]]:
+    """[start, end) byte ranges, start moves forward as the range is received."""
+    step = max(-(-size // max(workers, 1)), 1)
+    return [[start, min(start + step, size)] for start in range(0, size, step)]
+
+
+def _load_progress(progress_path: str, size: int, workers: int) -> List[List[int]]:
+    try:
+        with open(progress_path, "r", encoding="utf-8") as progress_file:
+            progress = json.load(progress_file)
+        if progress["size"] == size:
+            return progress["ranges"]
+    except (OSError, ValueError, KeyError):
+        pass
+    return _split(size, workers)
+
+
+def _fetch(url, part_path, progress_path, lock_path, size, ranges, on_progress):
+    session = pooled_session(pool_size=len(ranges))
+    lock = threading.Lock()
+    saved = [time.time()]
+
+    def save_progress(force=False):
+        if not force and time.time() - saved[0] < PROGRESS_INTERVAL:
+            return
+        tmp_path = f"{progress_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as progress_file:
+            json.dump({"url": url, "size": size, "ranges": ranges}, progress_file)
+        os.replace(tmp_path, progress_path)
+        os.utime(lock_path)  # keeps the lock fresh
+        saved[0] = time.time()
+
+    def fetch_range(byte_range: List[int]):
+        if byte_range[0] >= byte_range[1]:
+            return
+        headers = {"Range": f"bytes={byte_range[0]}-{byte_range[1] - 1}"}
+        with session.get(url, headers=headers, stream=True, timeout=30) as response:
+            if response.status_code != 206:
+                raise DownloadError(f"Expected a partial response, got {response.status_code}")
+            with open(part_path, "r+b") as part:
+                part.seek(byte_range[0])
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    chunk = chunk[: byte_range[1] - byte_range[0]]
+                    part.write(chunk)
+                    with lock:
+                        byte_range[0] += len(chunk)
+                        if on_progress is not None:
+                            remaining = sum(end - start for start, end in ranges)
+                            on_progress(size - remaining, size)
+                        part.flush()
+                        save_progress()
+                    if byte_range[0] >= byte_range[1]:
+                        break
+        if byte_range[0] < byte_range[1]:
+            raise DownloadError("The connection closed before the range was complete")
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(ranges)) as executor:
+            for future in [executor.submit(fetch_range, byte_range) for byte_range in ranges]:
+                future.result()
+    finally:
+        with lock:
+            save_progress(force=True)
+
+
+def _verify(part_path: str, size: int, sha256: Optional[str]):
+    if os.path.getsize(part_path) != size:
+        raise DownloadError(f"{part_path} is {os.path.getsize(part_path)} bytes, expected {size}")
+    if sha256 is None:
+        return
+    digest = hashlib.sha256()
+    with open(part_path, "rb") as part:
+        for chunk in iter(lambda: part.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    if digest.hexdigest() != sha256:
+        Path(part_path).unlink()
+        Path(f"{part_path}.json").unlink(missing_ok=True)
+        raise DownloadError(f"The sha256 of {part_path} doesn't match, the download was removed")
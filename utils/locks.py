@@ -0,0 +1,29 @@
+import os
+import time
+from contextlib import contextmanager
+
+LOCK_TIMEOUT = 30  # seconds after which a lock is considered left over by a killed process
+
+
+@contextmanager
+def locked(path: str):
+    """Holds an exclusive lock on path (through a path.lock file) shared by every process."""
+    lock_path = f"{path}.lock"
+    deadline = time.time() + LOCK_TIMEOUT
+    while True:
+        try:
+            lock = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            if time.time() > deadline:
+                try:
+                    os.unlink(lock_path)
+                except FileNotFoundError:
+                    pass
+                deadline = time.time() + LOCK_TIMEOUT
+            time.sleep(0.05)
+    try:
+        yield
+    finally:
+        os.close(lock)
+        os.unlink(lock_path)
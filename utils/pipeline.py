@@ -0,0 +1,93 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List
+
+from rich.table import Table
+
+from utils.console import console
+
+
+class Pipeline:
+    """A small dependency-graph scheduler.
+
+    Every stage is started as soon as all the stages it depends on have finished, so stages that
+    don't depend on each other run at the same time. A stage is called with the results of its
+    dependencies, in the order they were declared.
+
+    Example:
+        pipeline = Pipeline()
+        pipeline.add("post", get_post)
+        pipeline.add("audio", make_audio, "post")
+        pipeline.add("images", make_images, "post")
+        pipeline.add("video", make_video, "audio", "images")
+        pipeline.run()
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Callable] = {}
+        self.dependencies: Dict[str, List[str]] = {}
+        self.results: Dict[str, Any] = {}
+        self.timings: Dict[str, tuple] = {}  # name -> (start, end), relative to the run's start
+
+    def add(self, name: str, func: Callable, *dependencies: str):
+        for dependency in dependencies:
+            if dependency not in self.stages:
+                raise ValueError(f"Stage {name} depends on unknown stage {dependency}")
+        self.stages[name] = func
+        self.dependencies[name] = list(dependencies)
+
+    def run(self) -> Dict[str, Any]:
+        """Runs every stage. The first exception raised by a stage is re-raised once the stages
+        that are already running have finished, and nothing new is started after it."""
+        started = time.perf_counter()
+        pending = dict(self.dependencies)
+        running = {}
+        with ThreadPoolExecutor(max_workers=len(self.stages) or 1) as executor:
+            while pending or running:
+                for name in [n for n, deps in pending.items() if set(deps) <= self.results.keys()]:
+                    del pending[name]
+                    args = [self.results[dependency] for dependency in self.dependencies[name]]
+                    running[executor.submit(self._timed, name, started, args)] = name
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        wait(running)
+                        raise error
+                    self.results[name] = future.result()
+        return self.results
+
+    def _timed(self, name: str, started: float, args: list):
+        start = time.perf_counter() - started
+        try:
+            return self.stages[name](*args)
+        finally:
+            self.timings[name] = (start, time.perf_counter() - started)
+
+    def critical_path(self) -> List[str]:
+        """The chain of stages that decided the total run time, first stage first."""
+        if not self.timings:
+            return []
+        path = [max(self.timings, key=lambda name: self.timings[name][1])]
+        while self.dependencies[path[-1]]:
+            path.append(
+                max(self.dependencies[path[-1]], key=lambda name: self.timings.get(name, (0, 0))[1])
+            )
+        return path[::-1]
+
+    def print_summary(self):
+        critical = self.critical_path()
+        table = Table(title="Stage timings")
+        table.add_column("Stage")
+        table.add_column("Start (s)", justify="right")
+        table.add_column("Duration (s)", justify="right")
+        table.add_column("Critical path", justify="center")
+        for name, (start, end) in sorted(self.timings.items(), key=lambda item: item[1][0]):
+            on_path = "✔" if name in critical else ""
+            table.add_row(name, f"{start:.1f}", f"{end - start:.1f}", on_path)
+        console.print(table)
+        if critical:
+            total = self.timings[critical[-1]][1]
+            path = " → ".join(critical)
+            console.print(f"Critical path: {path} ({total:.1f}s)", style="bold blue")
@@ -0,0 +1,132 @@
+import cProfile
+import json
+import time
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+from typing import Callable
+
+from rich.table import Table
+
+from utils import settings
+from utils.console import console, print_substep
+
+PROFILES_PATH = "profiles"
+
+
+class Profiler:
+    """Opt-in (settings.profiling) timing of the stages of a run and of the frames of every layer
+    of the final video.
+
+    Every stage gets its wall time and a cProfile capture. Every video layer passed to time_frames
+    gets the number of frames it produced and the time spent producing them.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.stages = {}  # name -> seconds
+        self.captures = {}  # name -> cProfile.Profile
+        self.layers = {}  # name -> [frames, seconds, slowest frame in seconds]
+
+    @staticmethod
+    def enabled() -> bool:
+        return bool(settings.config["settings"]["profiling"])
+
+    @contextmanager
+    def stage(self, name: str):
+        capture = cProfile.Profile()
+        try:
+            capture.enable()
+        except ValueError:  # python 3.12+ allows a single active profiler, stages run in parallel
+            capture = None
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = time.perf_counter() - start
+            if capture is not None:
+                capture.disable()
+                self.captures[name] = capture
+
+    def wrap(self, name: str, func: Callable) -> Callable:
+        """Returns func timed as a stage, or func itself when profiling is off."""
+        if not self.enabled():
+            return func
+
+        @wraps(func)
+        def timed(*args, **kwargs):
+            with self.stage(name):
+                return func(*args, **kwargs)
+
+        return timed
+
+    def time_frames(self, clip, name: str):
+        """Times every get_frame call of clip (and of its mask) from now on, returns the clip."""
+        if not self.enabled():
+            return clip
+        self._wrap_get_frame(clip, name)
+        if clip.mask is not None:
+            self._wrap_get_frame(clip.mask, f"{name} mask")
+        return clip
+
+    def _wrap_get_frame(self, clip, name: str):
+        get_frame = clip.get_frame
+        layer = self.layers.setdefault(name, [0, 0.0, 0.0])
+
+        def timed_get_frame(t):
+            start = time.perf_counter()
+            frame = get_frame(t)
+            elapsed = time.perf_counter() - start
+            layer[0] += 1
+            layer[1] += elapsed
+            layer[2] = max(layer[2], elapsed)
+            return frame
+
+        # CompositeVideoClip looks get_frame up on the instance, so this shadows the method
+        clip.get_frame = timed_get_frame
+
+    def report(self, id: str):
+        """Saves report.json (and a .prof file per stage) to profiles/<id>-<time>/ and prints a
+        summary table. Nothing happens when profiling is off."""
+        if not self.enabled():
+            return
+        directory = Path(PROFILES_PATH) / f"{id}-{int(time.time())}"
+        directory.mkdir(parents=True, exist_ok=True)
+        for name, capture in self.captures.items():
+            capture.dump_stats(directory / f"{name}.prof")
+        report = {
+            "stages": {name: {"seconds": seconds} for name, seconds in self.stages.items()},
+            "layers": {
+                name: {
+                    "frames": frames,
+                    "seconds": seconds,
+                    "ms_per_frame": 1000 * seconds / frames if frames else 0,
+                    "slowest_frame_ms": 1000 * slowest,
+                }
+                for name, (frames, seconds, slowest) in self.layers.items()
+            },
+        }
+        with open(directory / "report.json", "w", encoding="utf-8") as report_file:
+            json.dump(report, report_file, indent=4)
+
+        table = Table(title="Frame timings per layer (nested layers are included in their parent)")
+        table.add_column("Layer")
+        table.add_column("Frames", justify="right")
+        table.add_column("Total (s)", justify="right")
+        table.add_column("ms/frame", justify="right")
+        table.add_column("Slowest (ms)", justify="right")
+        for name, layer in sorted(report["layers"].items(), key=lambda item: -item[1]["seconds"]):
+            table.add_row(
+                name,
+                str(layer["frames"]),
+                f"{layer['seconds']:.1f}",
+                f"{layer['ms_per_frame']:.1f}",
+                f"{layer['slowest_frame_ms']:.1f}",
+            )
+        console.print(table)
+        print_substep(f"Profile saved to {directory}", style="bold blue")
+
+
+profiler = Profiler()
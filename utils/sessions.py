@@ -0,0 +1,45 @@
+import random
+
+import requests
+from requests.adapters import HTTPAdapter, Retry
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class JitteredRetry(Retry):
+    """Exponential backoff with "full jitter", so parallel workers that got throttled together
+    don't all come back at the same moment."""
+
+    def get_backoff_time(self) -> float:
+        backoff = super().get_backoff_time()
+        return random.uniform(0, backoff) if backoff else 0
+
+
+def pooled_session(pool_size: int = 10, retries: int = 5, backoff_factor: float = 0.5):
+    """Creates a keep-alive session that reuses up to pool_size connections per host.
+
+    Connection errors, 5xx and 429 responses are retried with jittered exponential backoff,
+    honouring Retry-After. Once the retries run out the last response is returned as is, so
+    callers can still look at it (e.g. with utils.voice.check_ratelimit).
+
+    Args:
+        pool_size (int): Connections kept open per host, should match the number of workers
+        retries (int): How many times a request is retried
+        backoff_factor (float): Base of the exponential backoff, in seconds
+
+    Returns:
+        requests.Session: The configured session
+    """
+    retry = JitteredRetry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=None,  # the TTS APIs are POST only, and safe to repeat
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
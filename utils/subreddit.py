@@ -1,79 +1,133 @@
-import json
-from os.path import exists
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
 
 from utils import settings
 from utils.console import print_substep
+from utils.videos import claimed_ids, is_done
 
+VALID_TIME_FILTERS = [
+    "day",
+    "hour",
+    "month",
+    "week",
+    "year",
+    "all",
+]
+LISTING_LIMIT = 300  # posts per listing, praw requests them in pages of 100
+MAX_FETCHES = 16  # listings fetched at the same time
+QUEUE_SIZE = 10  # eligible posts kept ready ahead of time
 
-def get_subreddit_undone(submissions: list, subreddit, times_checked=0):
-    """_summary_
+# How candidates are ordered, "hot" keeps the order of the listings (hot, then top day, hour...)
+RANKINGS = {
+    "hot": None,
+    "score": lambda submission: submission.score,
+    "comments": lambda submission: submission.num_comments,
+    "upvote_ratio": lambda submission: (submission.upvote_ratio, submission.score),
+}
+
+
+class CandidateQueue:
+    """Posts of a subreddit that are ready to be made into a video, found ahead of time.
+
+    A background thread fetches hot and top over every time filter of every subreddit of the
+    a+b+c spec at the same time. It merges them without duplicates, ranks them by the
+    reddit.thread.rank_by setting and queues the posts that pass is_eligible. pop is called for
+    every video and only waits when nothing is queued yet.
+
+    praw isn't thread safe, so every listing is fetched with a client of its own, made by
+    new_reddit. A popped submission keeps the client it was fetched with.
+
+    Args:
+        new_reddit (Callable[[], praw.Reddit]): Makes a new (read only) client
+        subreddits (str): Subreddit name, or several joined with +
+    """
+
+    def __init__(self, new_reddit: Callable, subreddits: str):
+        self.new_reddit = new_reddit
+        self.subreddits = [name for name in subreddits.split("+") if name]
+        self.candidates = queue.Queue(maxsize=QUEUE_SIZE)
+        self.thread = threading.Thread(target=self._fill, name="reddit-candidates", daemon=True)
+        self.thread.start()
+
+    def listings(self):
+        """(subreddit, time filter) of every listing, None standing for hot."""
+        for name in self.subreddits:
+            yield name, None
+            for time_filter in VALID_TIME_FILTERS:
+                yield name, time_filter
+
+    def fetch_listing(self, listing: tuple) -> list:
+        name, time_filter = listing
+        subreddit = self.new_reddit().subreddit(name)
+        if time_filter is None:
+            return list(subreddit.hot(limit=LISTING_LIMIT))
+        return list(subreddit.top(time_filter=time_filter, limit=LISTING_LIMIT))
+
+    def fetch(self) -> list:
+        """Every post of every listing, in listing order and without duplicates."""
+        listings = list(self.listings())
+        with ThreadPoolExecutor(max_workers=min(len(listings), MAX_FETCHES)) as executor:
+            fetched = executor.map(self.fetch_listing, listings)
+            merged = {}
+            for submissions in fetched:
+                for submission in submissions:
+                    merged.setdefault(submission.id, submission)
+        return list(merged.values())
+
+    def _fill(self):
+        try:
+            submissions = self.fetch()
+            rank = RANKINGS.get(settings.config["reddit"]["thread"].get("rank_by", "hot"))
+            if rank is not None:
+                submissions.sort(key=rank, reverse=True)
+            for submission in submissions:
+                if is_eligible(submission):
+                    self.candidates.put(submission)
+        except Exception as error:  # the error is shown, and pop stops waiting for posts
+            print_substep(f"Couldn't get posts from reddit: {error}", style="bold red")
+        finally:
+            self.candidates.put(None)
+
+    def pop(self):
+        """Returns the next eligible submission, or None once every listing has been gone through."""
+        while True:
+            submission = self.candidates.get()
+            if submission is None:
+                self.candidates.put(None)  # later pops end too
+                return None
+            if is_eligible(submission):  # it may have been done since it was queued
+                return submission
+
+
+def is_eligible(submission) -> bool:
+    """Whether a video can be made out of the submission. It's checked while the queue fills in the
+    background, so skipped posts aren't reported.
 
     Args:
-        submissions (list): List of posts that are going to potentially be generated into a video
-        subreddit (praw.Reddit.SubredditHelper): Chosen subreddit
+        submission (Any): The submission
 
     Returns:
-        Any: The submission that has not been done
+        Boolean: Whether the submission can be used
     """
-    # recursively checks if the top submission in the list was already done.
-    if not exists("./video_creation/data/videos.json"):
-        with open("./video_creation/data/videos.json", "w+") as f:
-            json.dump([], f)
-    with open("./video_creation/data/videos.json", "r", encoding="utf-8") as done_vids_raw:
-        done_videos = json.load(done_vids_raw)
-    for submission in submissions:
-        if already_done(done_videos, submission):
-            continue
-        if submission.over_18:
-            try:
-                if not settings.config["settings"]["allow_nsfw"]:
-                    print_substep("NSFW Post Detected. Skipping...")
-                    continue
-            except AttributeError:
-                print_substep("NSFW settings not defined. Skipping NSFW post...")
-        if submission.stickied:
-            print_substep("This post was pinned by moderators. Skipping...")
-            continue
-        if submission.num_comments <= int(settings.config["reddit"]["thread"]["min_comments"]):
-            print_substep(
-                f'This post has under the specified minimum of comments ({settings.config["reddit"]["thread"]["min_comments"]}). Skipping...'
-            )
-            continue
-        return submission
-    print("all submissions have been done going by top submission order")
-    VALID_TIME_FILTERS = [
-        "day",
-        "hour",
-        "month",
-        "week",
-        "year",
-        "all",
-    ]  # set doesn't have __getitem__
-    index = times_checked + 1
-    if index == len(VALID_TIME_FILTERS):
-        print("all time filters have been checked you absolute madlad ")
-
-    return get_subreddit_undone(
-        subreddit.top(
-            time_filter=VALID_TIME_FILTERS[index], limit=(50 if int(index) == 0 else index + 1 * 50)
-        ),
-        subreddit,
-        times_checked=index,
-    )  # all the videos in hot have already been done
-
-
-def already_done(done_videos: list, submission) -> bool:
-    """Checks to see if the given submission is in the list of videos
+    if already_done(submission):
+        return False
+    if submission.over_18 and not settings.config["settings"]["allow_nsfw"]:
+        return False
+    if submission.stickied:  # pinned by moderators
+        return False
+    return submission.num_comments > int(settings.config["reddit"]["thread"]["min_comments"])
+
+
+def already_done(submission) -> bool:
+    """Checks to see if the given submission is already done or being made
 
     Args:
-        done_videos (list): Finished videos
         submission (Any): The submission
 
     Returns:
-        Boolean: Whether the video was found in the list
+        Boolean: Whether the video was found
     """
 
-    for video in done_videos:
-        if video["id"] == str(submission):
-            return True
-    return False
+    return str(submission) in claimed_ids or is_done(str(submission))
@@ -0,0 +1,109 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List
+
+from utils import settings
+from utils.console import print_substep
+from utils.locks import locked
+
+CACHE_PATH = "assets/cache/translations.json"
+# Sent between segments of a batch. Google leaves the markers alone and keeps them on their own line
+SEPARATOR = "\n[[§]]\n"
+MAX_BATCH_CHARS = 4500  # the free google endpoint starts failing a little above 5000 characters
+
+_lock = threading.Lock()
+_cache: Dict[str, Dict[str, str]] = {}  # language -> {text: translation}
+_loaded = False
+
+
+def translate(text: str, lang: str = None) -> str:
+    """Translates text to lang (post_lang by default), using the cache when possible."""
+    return translate_many([text], lang)[0]
+
+
+def translate_many(texts: List[str], lang: str = None) -> List[str]:
+    """Translates every text in the list with as few requests as possible.
+
+    Identical texts are only translated once, texts that were translated before (in this or an
+    earlier run) are read from assets/cache/translations.json, and the rest are joined into
+    batches so that a whole post costs one or two requests instead of one per sentence.
+
+    Args:
+        texts (List[str]): Texts to translate
+        lang (str): Language to translate to. Defaults to reddit.thread.post_lang
+
+    Returns:
+        List[str]: The translations, in the same order as texts
+    """
+    lang = lang or settings.config["reddit"]["thread"]["post_lang"]
+    if not lang:
+        return list(texts)
+    with _lock:
+        cache = _load_cache().setdefault(lang, {})
+        missing = list(dict.fromkeys(text for text in texts if text.strip() and text not in cache))
+    if missing:
+        print_substep(f"Translating {len(missing)} text(s)...")
+        translations = {}
+        for batch in _batches(missing):
+            translations.update(zip(batch, _translate_batch(batch, lang)))
+        with _lock:
+            cache.update(translations)
+            _save_cache()
+    return [cache.get(text, text) for text in texts]
+
+
+def _batches(texts: List[str]):
+    batch, size = [], 0
+    for text in texts:
+        if batch and size + len(text) + len(SEPARATOR) > MAX_BATCH_CHARS:
+            yield batch
+            batch, size = [], 0
+        batch.append(text)
+        size += len(text) + len(SEPARATOR)
+    if batch:
+        yield batch
+
+
+def _translate_batch(batch: List[str], lang: str) -> List[str]:
+    # imported here, importing translators already needs the network and runs without post_lang
+    # must work offline
+    import translators as ts
+
+    if len(batch) > 1:
+        translated = ts.google(SEPARATOR.join(batch), to_language=lang)
+        parts = [part.strip() for part in translated.split(SEPARATOR.strip())]
+        if len(parts) == len(batch):
+            return parts
+        # the translator merged or dropped a marker, don't guess which text is which
+    return [ts.google(text, to_language=lang) for text in batch]
+
+
+def _read_cache() -> Dict[str, Dict[str, str]]:
+    try:
+        with open(CACHE_PATH, "r", encoding="utf-8") as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _load_cache() -> Dict[str, Dict[str, str]]:
+    global _loaded
+    if not _loaded:
+        _cache.update(_read_cache())
+        _loaded = True
+    return _cache
+
+
+def _save_cache():
+    """Merges the translations of this process into the file, other batch workers write it too."""
+    Path(CACHE_PATH).parent.mkdir(parents=True, exist_ok=True)
+    with locked(CACHE_PATH):
+        for lang, translations in _read_cache().items():
+            for text, translation in translations.items():
+                _cache.setdefault(lang, {}).setdefault(text, translation)
+        tmp_path = f"{CACHE_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as cache_file:
+            json.dump(_cache, cache_file, ensure_ascii=False)
+        os.replace(tmp_path, CACHE_PATH)
@@ -1,10 +1,72 @@
 import json
+import os
+import sqlite3
+import threading
 import time
 
 from praw.models import Submission
 
 from utils import settings
 from utils.console import print_step
+from utils.locks import locked
+
+VIDEOS_PATH = "./video_creation/data/videos.json"  # exported for the GUI, read by the import
+DB_PATH = "./video_creation/data/videos.db"
+COLUMNS = ("subreddit", "id", "time", "background_credit", "reddit_title", "filename")
+
+# Posts picked by this process that aren't rendered yet, so a batch never picks the same post twice
+claimed_ids = set()
+
+local = threading.local()  # sqlite connections can't be shared between threads
+
+
+def claim(reddit_id: str):
+    """Marks a post as taken, check_done and the candidate queue skip it from now on."""
+    claimed_ids.add(reddit_id)
+
+
+def connect() -> sqlite3.Connection:
+    """The connection of the current thread to the done videos database.
+
+    The database is created on first use and filled with the contents of videos.json, so the
+    history of older versions carries over.
+    """
+    # a forked batch worker inherits the connection of its parent, and must not use it
+    if getattr(local, "pid", None) == os.getpid():
+        return local.connection
+    connection = sqlite3.connect(DB_PATH, timeout=30)
+    connection.execute("PRAGMA journal_mode=WAL")  # readers don't wait for a writing process
+    with locked(DB_PATH), connection:
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS videos (id TEXT PRIMARY KEY, subreddit TEXT, time TEXT,"
+            " background_credit TEXT, reddit_title TEXT, filename TEXT)"
+        )
+        connection.execute("CREATE TABLE IF NOT EXISTS imports (path TEXT PRIMARY KEY)")
+        imported = connection.execute("SELECT 1 FROM imports WHERE path = ?", (VIDEOS_PATH,))
+        if imported.fetchone() is None:
+            import_json(connection)
+    local.connection, local.pid = connection, os.getpid()
+    return connection
+
+
+def import_json(connection: sqlite3.Connection):
+    try:
+        with open(VIDEOS_PATH, "r", encoding="utf-8") as done_vids_raw:
+            done_videos = json.load(done_vids_raw)
+    except (OSError, ValueError):
+        done_videos = []
+    with connection:  # a single transaction, so every video is imported or none
+        connection.executemany(
+            f"INSERT OR IGNORE INTO videos ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * 6)})",
+            [tuple(video.get(column) for column in COLUMNS) for video in done_videos],
+        )
+        connection.execute("INSERT INTO imports VALUES (?)", (VIDEOS_PATH,))
+
+
+def is_done(reddit_id: str) -> bool:
+    """Whether a video has already been made out of the post."""
+    row = connect().execute("SELECT 1 FROM videos WHERE id = ?", (reddit_id,)).fetchone()
+    return row is not None
 
 
 def check_done(
@@ -19,22 +81,23 @@ def check_done(
     Returns:
         Submission|None: Reddit object in args
     """
-    with open("./video_creation/data/videos.json", "r", encoding="utf-8") as done_vids_raw:
-        done_videos = json.load(done_vids_raw)
-    for video in done_videos:
-        if video["id"] == str(redditobj):
-            if settings.config["reddit"]["thread"]["post_id"]:
-                print_step(
-                    "You already have done this video but since it was declared specifically in the config file the program will continue"
-                )
-                return redditobj
-            print_step("Getting new post as the current one has already been done")
-            return None
+    if str(redditobj) in claimed_ids and not settings.config["reddit"]["thread"]["post_id"]:
+        print_step("Getting new post as the current one is already being made")
+        return None
+    if is_done(str(redditobj)):
+        if settings.config["reddit"]["thread"]["post_id"]:
+            print_step(
+                "You already have done this video but since it was declared specifically in the config file the program will continue"
+            )
+            return redditobj
+        print_step("Getting new post as the current one has already been done")
+        return None
     return redditobj
 
 
 def save_data(subreddit: str, filename: str, reddit_title: str, reddit_id: str, credit: str):
-    """Saves the videos that have already been generated to a JSON file in video_creation/data/videos.json
+    """Saves the videos that have already been generated to video_creation/data/videos.db, and
+    exports them to video_creation/data/videos.json for the GUI
 
     Args:
         filename (str): The finished video title name
@@ -43,18 +106,31 @@ def save_data(subreddit: str, filename: str, reddit_title: str, reddit_id: str,
         @param reddit_id:
         @param reddit_title:
     """
-    with open("./video_creation/data/videos.json", "r+", encoding="utf-8") as raw_vids:
-        done_vids = json.load(raw_vids)
-        if reddit_id in [video["id"] for video in done_vids]:
-            return  # video already done but was specified to continue anyway in the config file
-        payload = {
-            "subreddit": subreddit,
-            "id": reddit_id,
-            "time": str(int(time.time())),
-            "background_credit": credit,
-            "reddit_title": reddit_title,
-            "filename": filename,
-        }
-        done_vids.append(payload)
-        raw_vids.seek(0)
-        json.dump(done_vids, raw_vids, ensure_ascii=False, indent=4)
+    payload = {
+        "subreddit": subreddit,
+        "id": reddit_id,
+        "time": str(int(time.time())),
+        "background_credit": credit,
+        "reddit_title": reddit_title,
+        "filename": filename,
+    }
+    connection = connect()
+    # a video that is already there was specified to continue anyway in the config file
+    with connection:
+        connection.execute(
+            f"INSERT OR IGNORE INTO videos ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * 6)})",
+            tuple(payload[column] for column in COLUMNS),
+        )
+    export_json()
+
+
+def export_json():
+    """Writes every done video to videos.json, in the order they were made."""
+    with locked(VIDEOS_PATH):
+        rows = connect().execute(f"SELECT {', '.join(COLUMNS)} FROM videos ORDER BY rowid")
+        done_vids = [dict(zip(COLUMNS, row)) for row in rows]
+        # written next to the file and swapped in, so readers never see a half written list
+        tmp_path = f"{VIDEOS_PATH}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as raw_vids:
+            json.dump(done_vids, raw_vids, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, VIDEOS_PATH)
@@ -0,0 +1,63 @@
+import hashlib
+import os
+from pathlib import Path
+
+from moviepy.video.fx import mask_color
+from moviepy.video.io.ffmpeg_writer import ffmpeg_write_video
+from moviepy.editor import VideoFileClip  # with resize attached
+
+from utils.console import print_substep
+
+CACHE_PATH = "assets/cache/animation"
+KEY_COLOR = [64, 222, 0]
+KEY_THRESHOLD = 150
+KEY_STIFFNESS = 5
+
+
+def keyed_animation(animation_path: str, width: int) -> str:
+    """Returns a version of the green screen animation that already has its alpha channel and is
+    resized to width, creating it the first time it's needed.
+
+    The keyed copy is a png-in-mov file (the png codec keeps the alpha channel), cached under
+    assets/cache/animation by the hash of the source file, the key color, threshold, stiffness and
+    width. Renders only have to overlay it, instead of running mask_color on every frame.
+
+    Args:
+        animation_path (str): Path of the green screen animation
+        width (int): Width of the animation in the video
+
+    Returns:
+        str: Path of the keyed animation
+    """
+    digest = hashlib.sha256()
+    with open(animation_path, "rb") as source:
+        for chunk in iter(lambda: source.read(1024 * 1024), b""):
+            digest.update(chunk)
+    for setting in (KEY_COLOR, KEY_THRESHOLD, KEY_STIFFNESS, width):
+        digest.update(str(setting).encode())
+    keyed_path = Path(CACHE_PATH) / f"{digest.hexdigest()}.mov"
+    if keyed_path.is_file():
+        return str(keyed_path)
+
+    print_substep("Removing the green screen of the animation, this is only done once...")
+    keyed_path.parent.mkdir(parents=True, exist_ok=True)
+    partial_path = keyed_path.with_suffix(f".{os.getpid()}.mov")
+    with VideoFileClip(animation_path) as animation_clip:
+        masked_clip = mask_color.mask_color(
+            animation_clip, color=KEY_COLOR, thr=KEY_THRESHOLD, s=KEY_STIFFNESS
+        ).resize(width=width)
+        ffmpeg_write_video(
+            masked_clip,
+            str(partial_path),
+            animation_clip.fps,
+            codec="png",
+            withmask=True,
+            logger=None,
+        )
+    os.replace(partial_path, keyed_path)
+    return str(keyed_path)
+
+
+def load_keyed_animation(keyed_path: str) -> VideoFileClip:
+    """Opens a keyed animation with its alpha channel as the clip's mask."""
+    return VideoFileClip(keyed_path, has_mask=True)
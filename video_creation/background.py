@@ -1,31 +1,53 @@
+import os
 from pathlib import Path
 import random
 from random import randrange
 import re
-from typing import Any, Tuple
+import subprocess
+import threading
+import uuid
+from typing import Any, List, Tuple
 
 
+from moviepy.config import get_setting
 from moviepy.editor import VideoFileClip
-from moviepy.video.io.ffmpeg_tools import ffmpeg_extract_subclip
 from pytube import YouTube
-from pytube.cli import on_progress
 
 from utils import settings
+from utils.background_index import background_info
 from utils.CONSTANTS import background_options
 from utils.console import print_step, print_substep
+from utils.download import download_file
 
+PROXY_PATH = "assets/backgrounds/proxy"
+POOL_PATH = "assets/backgrounds/pool"
+POOL_BUCKETS = (30, 45, 60)  # seconds
+W, H = 1080, 1920
+DOWNLOAD_WORKERS = 4  # byte ranges fetched at the same time, YouTube throttles each connection
 
-def get_start_and_end_times(video_length: int, length_of_clip: int) -> Tuple[int, int]:
+refill_lock = threading.Lock()
+
+
+def get_start_and_end_times(
+    video_length: int, length_of_clip: int, keyframes: List[float] = None
+) -> Tuple[int, int]:
     """Generates a random interval of time to be used as the background of the video.
 
     Args:
         video_length (int): Length of the video
         length_of_clip (int): Length of the video to be used as the background
+        keyframes (List[float]): Keyframe timestamps of the background. When given, the interval
+            starts on one of them, so it can be cut without re-encoding
 
     Returns:
         tuple[int,int]: Start and end time of the randomized interval
     """
-    random_time = randrange(180, int(length_of_clip) - int(video_length))
+    latest_start = int(length_of_clip) - int(video_length)
+    starts = [time for time in keyframes or [] if 180 <= time < latest_start]
+    if starts:
+        random_time = random.choice(starts)
+    else:
+        random_time = randrange(180, latest_start)
     return random_time, random_time + video_length
 
 
@@ -47,6 +69,11 @@ def get_background_config():
 
 
 
+def on_progress(received: int, size: int):
+    end = "" if received < size else "\n"
+    print(f"\r{received / 1024 ** 2:.0f}/{size / 1024 ** 2:.0f} MB", end=end)
+
+
 def download_background(background_config: Tuple[str, str, str, Any]):
     """Downloads the background/s video from YouTube."""
     Path("./assets/backgrounds/").mkdir(parents=True, exist_ok=True)
@@ -59,12 +86,157 @@ def download_background(background_config: Tuple[str, str, str, Any]):
     )
     print_substep("Downloading the backgrounds videos... please be patient 🙏 ")
     print_substep(f"Downloading {filename} from {uri}")
-    YouTube(uri, on_progress_callback=on_progress).streams.filter(res="1080p").first().download(
-        "assets/backgrounds", filename=f"{credit}-{filename}"
+    stream = YouTube(uri).streams.filter(res="1080p").first()
+    download_file(
+        stream.url,
+        f"assets/backgrounds/{credit}-{filename}",
+        stream.filesize,
+        workers=DOWNLOAD_WORKERS,
+        on_progress=on_progress,
     )
     print_substep("Background video downloaded successfully! 🎉", style="bold green")
 
 
+def background_proxy_path(background_config: Tuple[str, str, str, Any]) -> Path:
+    _, filename, credit, _ = background_config
+    return Path(PROXY_PATH) / f"{credit}-{filename}"
+
+
+def make_background_proxy(background_config: Tuple[str, str, str, Any]):
+    """Transcodes the downloaded background once into a 1080x1920 portrait proxy.
+
+    The final video only ever shows the center 1080x1920 of the background scaled to a height of
+    1920, so the proxy is exactly that crop. Renders then decode frames of the final size instead
+    of resizing a 3413x1920 frame and throwing most of it away. The proxy has a keyframe every
+    second, so it can be cut anywhere without re-encoding.
+    """
+    _, filename, credit, _ = background_config
+    proxy_path = background_proxy_path(background_config)
+    if proxy_path.is_file():
+        return
+    print_substep(f"Preparing {filename} for the vertical video, this is only done once...")
+    proxy_path.parent.mkdir(parents=True, exist_ok=True)
+    partial_path = proxy_path.with_suffix(f".{os.getpid()}.mp4")
+    # fmt: off
+    subprocess.run(
+        [
+            get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error",
+            "-i", f"assets/backgrounds/{credit}-{filename}",
+            "-vf", f"scale=-2:{H},crop={W}:{H}",
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", "18", "-pix_fmt", "yuv420p",
+            "-force_key_frames", "expr:gte(t,n_forced*1)",
+            "-c:a", "copy",
+            str(partial_path),
+        ],
+        check=True,
+    )
+    # fmt: on
+    os.replace(partial_path, proxy_path)
+    background_info(str(proxy_path))  # index it now, so chopping never has to probe it
+    print_substep("Background video prepared successfully!", style="bold green")
+
+
+def ingest_backgrounds():
+    """Creates the proxy of every background in utils.CONSTANTS that has been downloaded."""
+    for background_config in background_options.values():
+        _, filename, credit, _ = background_config
+        if Path(f"assets/backgrounds/{credit}-{filename}").is_file():
+            make_background_proxy(background_config)
+
+
+def cut_background(source: str, start_time: float, end_time: float, target: str):
+    """Copies the streams of source between start_time and end_time to target, without re-encoding.
+
+    The cut starts on the keyframe at (or right before) start_time, which is start_time itself when
+    it was picked from the keyframes of the background.
+    """
+    # fmt: off
+    subprocess.run(
+        [
+            get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error",
+            "-ss", f"{start_time:.3f}", "-i", source, "-t", f"{end_time - start_time:.3f}",
+            "-map", "0:v:0", "-map", "0:a?", "-c", "copy", "-avoid_negative_ts", "make_zero",
+            target,
+        ],
+        check=True,
+    )
+    # fmt: on
+
+
+def pool_path(background_config: Tuple[str, str, str, Any], bucket: int) -> Path:
+    """The pool directory of a bucket. It is named after the proxy's mtime, so a new proxy never
+    gets served segments cut from the old one."""
+    proxy_path = background_proxy_path(background_config)
+    mtime = int(proxy_path.stat().st_mtime)
+    return Path(POOL_PATH) / f"{proxy_path.stem}-{mtime}" / str(bucket)
+
+
+def take_pooled_segment(
+    background_config: Tuple[str, str, str, Any], video_length: float, target: str
+) -> bool:
+    """Moves a pre-cut segment that is at least video_length long to target.
+
+    Returns:
+        bool: False when no pooled segment is long enough or the pool is empty
+    """
+    if not settings.config["settings"]["background"]["pool_size"]:
+        return False
+    for bucket in POOL_BUCKETS:
+        if bucket < video_length:
+            continue
+        directory = pool_path(background_config, bucket)
+        if not directory.is_dir():
+            continue
+        for segment in os.scandir(directory):
+            if segment.name.endswith(".part.mp4"):
+                continue
+            try:
+                os.replace(segment.path, target)
+            except FileNotFoundError:  # another process took it first
+                continue
+            return True
+    return False
+
+
+def refill_pool(background_config: Tuple[str, str, str, Any]):
+    """Cuts segments until every bucket of the background's pool holds settings pool_size of them."""
+    pool_size = settings.config["settings"]["background"]["pool_size"]
+    if not pool_size:
+        return
+    source = str(background_proxy_path(background_config))
+    info = background_info(source)
+    for bucket in POOL_BUCKETS:
+        if info["duration"] - 180 <= bucket:
+            continue
+        directory = pool_path(background_config, bucket)
+        directory.mkdir(parents=True, exist_ok=True)
+        stored = [name for name in os.listdir(directory) if not name.endswith(".part.mp4")]
+        for _ in range(pool_size - len(stored)):
+            start_time, end_time = get_start_and_end_times(
+                bucket, info["duration"], info["keyframes"]
+            )
+            segment = directory / f"{uuid.uuid4().hex}.mp4"
+            partial_segment = segment.with_suffix(".part.mp4")
+            cut_background(source, start_time, end_time, str(partial_segment))
+            os.replace(partial_segment, segment)
+
+
+def refill_pool_in_background(background_config: Tuple[str, str, str, Any]) -> threading.Thread:
+    """Refills the pool of a background in a separate thread, meant to run once a video is done.
+    Only one refill runs at a time in a process."""
+
+    def refill():
+        with refill_lock:
+            try:
+                refill_pool(background_config)
+            except (OSError, subprocess.CalledProcessError) as error:
+                print_substep(f"Couldn't refill the background pool: {error}", style="bold red")
+
+    thread = threading.Thread(target=refill, name="background-pool-refill")
+    thread.start()
+    return thread
+
+
 def chop_background_video(background_config: Tuple[str, str, str, Any], video_length: int, reddit_object: dict):
     """Generates the background footage to be used in the video and writes it to assets/temp/background.mp4
 
@@ -74,23 +246,25 @@ def chop_background_video(background_config: Tuple[str, str, str, Any], video_le
     """
 
     print_step("Finding a spot in the backgrounds video to chop...✂️")
-    choice = f"{background_config[2]}-{background_config[1]}"
+    make_background_proxy(background_config)
+    source = str(background_proxy_path(background_config))
     id = re.sub(r"[^\w\s-]", "", reddit_object["thread_id"])
-    background = VideoFileClip(f"assets/backgrounds/{choice}")
+    if take_pooled_segment(background_config, video_length, f"assets/temp/{id}/background.mp4"):
+        print_substep("Background video taken from the pool!", style="bold green")
+        return background_config[2]
+    info = background_info(source)
 
-    start_time, end_time = get_start_and_end_times(video_length, background.duration)
+    start_time, end_time = get_start_and_end_times(video_length, info["duration"], info["keyframes"])
     try:
-        ffmpeg_extract_subclip(
-            f"assets/backgrounds/{choice}",
-            start_time,
-            end_time,
-            targetname=f"assets/temp/{id}/background.mp4",
-        )
-    except (OSError, IOError):  # ffmpeg issue see #348
+        cut_background(source, start_time, end_time, f"assets/temp/{id}/background.mp4")
+    except (OSError, IOError, subprocess.CalledProcessError):  # ffmpeg issue see #348
         print_substep("FFMPEG issue. Trying again...")
-        with VideoFileClip(f"assets/backgrounds/{choice}") as video:
+        with VideoFileClip(source) as video:
             new = video.subclip(start_time, end_time)
             new.write_videofile(f"assets/temp/{id}/background.mp4")
     print_substep("Background video chopped successfully!", style="bold green")
     return background_config[2]
 
+
+if __name__ == "__main__":
+    ingest_backgrounds()
@@ -0,0 +1,209 @@
+import asyncio
+import atexit
+import hashlib
+import json
+import os
+import threading
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Awaitable
+from urllib.parse import urlparse
+
+from playwright.async_api import async_playwright, Browser, BrowserContext, Page, Playwright
+from playwright.async_api import Request, Route
+
+from utils import settings
+from utils.console import print_substep
+
+STATE_PATH = "assets/cache/browser"
+COOKIE_FILES = {
+    "dark": "./video_creation/data/cookie-dark-mode.json",
+    "light": "./video_creation/data/cookie-light-mode.json",
+}
+MAX_CONTEXT_USES = 20  # a context is replaced after this many posts, so it doesn't grow forever
+
+
+def setting_list(name: str) -> list:
+    """A comma separated list from the settings.screenshots section."""
+    value = settings.config["settings"].get("screenshots", {}).get(name, "")
+    return [item.strip() for item in str(value).split(",") if item.strip()]
+
+
+class RequestFilter:
+    """Aborts the requests the screenshots don't need, and counts what every page loaded.
+
+    A request is blocked when its resource type is in settings.screenshots.block_resource_types
+    or its host is (a subdomain of) one in block_domains, unless its url contains one of the
+    allow_urls.
+    """
+
+    def __init__(self):
+        self.resource_types = set(setting_list("block_resource_types"))
+        self.domains = setting_list("block_domains")
+        self.allowed = setting_list("allow_urls")
+        self.pages = {}  # page -> [requests loaded, requests blocked, bytes loaded]
+
+    def blocks(self, request: Request) -> bool:
+        if any(allowed in request.url for allowed in self.allowed):
+            return False
+        if request.resource_type in self.resource_types:
+            return True
+        host = urlparse(request.url).hostname or ""
+        return any(host == domain or host.endswith(f".{domain}") for domain in self.domains)
+
+    def _stats(self, request: Request) -> list:
+        try:
+            page = request.frame.page
+        except Exception:  # requests of service workers have no page
+            page = None
+        if page is not None and page.is_closed():
+            return [0, 0, 0]  # counted nowhere, so a closed page is never kept in pages
+        if page not in self.pages:
+            self.pages[page] = [0, 0, 0]
+            if page is not None:
+                # requests can finish between report and close, these are dropped with the page
+                page.once("close", lambda: self.pages.pop(page, None))
+        return self.pages[page]
+
+    async def route(self, route: Route):
+        if self.blocks(route.request):
+            self._stats(route.request)[1] += 1
+            await route.abort("blockedbyclient")
+        else:
+            await route.continue_()
+
+    async def finished(self, request: Request):
+        stats = self._stats(request)
+        stats[0] += 1
+        try:
+            stats[2] += (await request.sizes())["responseBodySize"]
+        except Exception:  # the page closed before the sizes could be read
+            pass
+
+    def report(self, page: Page):
+        """Prints what the page loaded and what was blocked, and forgets the page."""
+        loaded, blocked, size = self.pages.pop(page, [0, 0, 0])
+        print_substep(
+            f"Loaded {loaded} requests ({size / 1024 ** 2:.1f} MB), blocked {blocked}",
+            style="dim",
+        )
+
+
+class BrowserService:
+    """A headless Chromium that stays open for the whole process, with a ready context per theme.
+
+    Playwright's async API runs on an event loop in a thread of its own, so any thread can hand
+    it a coroutine with run. The preference cookies of a theme are loaded into its first
+    context and saved as Playwright storage state under assets/cache/browser, named after the
+    hash of the cookie file, the contexts after it start from that state. A context is closed after MAX_CONTEXT_USES posts or as soon
+    as something fails in it, and the browser is relaunched if it crashed. Every context goes
+    through request_filter.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="browser", daemon=True)
+        self.thread.start()
+        self.playwright: Playwright = None
+        self.browser: Browser = None
+        self.contexts = {}  # theme -> [BrowserContext, uses]
+        self.request_filter = RequestFilter()
+        self.lock = asyncio.Lock()
+
+    def run(self, coroutine: Awaitable):
+        """Runs the coroutine on the browser's event loop and returns its result."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def warm(self, theme: str):
+        """Starts the browser and the context of theme in the background, without waiting."""
+
+        async def warm():
+            async with self.lease(theme):
+                pass
+
+        asyncio.run_coroutine_threadsafe(warm(), self.loop)
+
+    async def _browser(self) -> Browser:
+        if self.playwright is None:
+            self.playwright = await async_playwright().start()
+        if self.browser is None or not self.browser.is_connected():
+            print_substep("Launching Headless Browser...")
+            self.browser = await self.playwright.chromium.launch()
+            self.contexts.clear()
+        return self.browser
+
+    async def _context(self, theme: str) -> BrowserContext:
+        async with self.lock:
+            browser = await self._browser()
+            if theme in self.contexts:
+                entry = self.contexts[theme]
+                if entry[1] < MAX_CONTEXT_USES:
+                    entry[1] += 1
+                    return entry[0]
+                await self._discard(theme)
+            with open(COOKIE_FILES[theme], "rb") as cookie_file:
+                cookie_data = cookie_file.read()
+            # named after the cookies it was made from, so editing the cookie file makes a new one
+            cookie_hash = hashlib.sha256(cookie_data).hexdigest()[:16]
+            state_path = Path(STATE_PATH) / f"{theme}-{cookie_hash}.json"
+            if state_path.is_file():
+                context = await browser.new_context(storage_state=str(state_path))
+            else:
+                context = await browser.new_context()
+                await context.add_cookies(json.loads(cookie_data))  # load preference cookies
+                state_path.parent.mkdir(parents=True, exist_ok=True)
+                for outdated in state_path.parent.glob(f"{theme}*.json"):
+                    outdated.unlink(missing_ok=True)
+                await context.storage_state(path=str(state_path))
+            await context.route("**/*", self.request_filter.route)
+            context.on("requestfinished", self.request_filter.finished)
+            self.contexts[theme] = [context, 1]
+            return context
+
+    async def _discard(self, theme: str):
+        context, _ = self.contexts.pop(theme)
+        try:
+            await context.close()
+        except Exception:  # it's already gone if the browser crashed
+            pass
+
+    @asynccontextmanager
+    async def lease(self, theme: str):
+        """A warm context with the preference cookies of theme. Close the pages you open in it."""
+        context = await self._context(theme)
+        try:
+            yield context
+        except Exception:
+            async with self.lock:
+                if self.contexts.get(theme, [None])[0] is context:
+                    await self._discard(theme)
+            raise
+
+    async def _close(self):
+        for theme in list(self.contexts):
+            await self._discard(theme)
+        if self.browser is not None:
+            await self.browser.close()
+        if self.playwright is not None:
+            await self.playwright.stop()
+
+    def close(self):
+        try:
+            self.run(self._close())
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+service = None
+service_pid = None  # a forked batch worker can't use the browser thread of its parent
+service_lock = threading.Lock()
+
+
+def browser_service() -> BrowserService:
+    """The browser service of the current process, started on first use."""
+    global service, service_pid
+    with service_lock:
+        if service is None or service_pid != os.getpid():
+            service, service_pid = BrowserService(), os.getpid()
+            atexit.register(service.close)
+        return service
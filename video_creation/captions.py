@@ -0,0 +1,104 @@
+import hashlib
+from pathlib import Path
+from typing import List
+
+import imgkit
+import numpy as np
+from PIL import Image
+
+from utils import settings
+from utils.cache import FileCache
+from utils.console import print_substep
+
+CACHE_PATH = "assets/cache/captions"
+
+# Drawn between the lines of the atlas, and looked for when cutting it back into lines
+SEPARATOR_COLOR = (255, 0, 255)
+SEPARATOR = '<div style="height: 6px; margin: 0; background-color: #ff00ff;"></div>'
+
+
+def render_captions(lines: List[str], paths: List[str], css: str, options: dict):
+    """Saves the caption image of every line, rendering only the ones that aren't cached yet.
+
+    Cached images are keyed by the text, the contents of the css file and the imgkit options, so
+    editing the theme or the render width never reuses a stale image.
+
+    Args:
+        lines (List[str]): Caption texts
+        paths (List[str]): Where to save the png of each line
+        css (str): Path of the caption theme
+        options (dict): imgkit options, as used for a single line
+    """
+    cache_size = settings.config["captions"]["cache_size"]
+    if not cache_size:
+        return render_caption_atlas(lines, paths, css, options)
+    cache = FileCache(CACHE_PATH, cache_size, ".png")
+    with open(css, "rb") as css_file:
+        css_hash = hashlib.sha256(css_file.read()).hexdigest()
+    render_options = sorted(options.items())
+    keys = [FileCache.key(line, css_hash, render_options) for line in lines]
+    missing = [
+        (line, path, key)
+        for line, path, key in zip(lines, paths, keys)
+        if cache.get(key, path) is None
+    ]
+    render_caption_atlas(
+        [line for line, _, _ in missing], [path for _, path, _ in missing], css, options
+    )
+    for _, path, key in missing:
+        cache.put(key, path)
+    cache.flush()
+    print_substep(f"Caption cache: {cache.stats()}")
+
+
+def render_caption_atlas(lines: List[str], paths: List[str], css: str, options: dict):
+    """Renders every caption line to its own png with a single wkhtmltoimage run.
+
+    The lines are laid out one under the other in one document, each followed by a separator bar.
+    The separator has a height, so the margins of the lines can't collapse through it and every
+    slice ends up exactly as tall as a page rendered for that line alone.
+    If the atlas can't be cut into the expected number of slices, every line is rendered on its own.
+
+    Args:
+        lines (List[str]): Caption texts
+        paths (List[str]): Where to save the png of each line
+        css (str): Path of the caption theme
+        options (dict): imgkit options, as used for a single line
+    """
+    if not lines:
+        return
+    for path in paths:
+        # a file left by an earlier run may be hard-linked into the cache, saving over it in place
+        # would change the cached image
+        Path(path).unlink(missing_ok=True)
+    atlas_path = f"{paths[0]}.atlas.png"
+    html = SEPARATOR.join(f"<span>{line}</span>" for line in lines)
+    imgkit.from_string(html, atlas_path, css=css, options=options)
+    with Image.open(atlas_path) as atlas:
+        atlas = atlas.convert("RGB")
+    Path(atlas_path).unlink()
+    slices = _split_atlas(atlas)
+    if len(slices) == len(lines):
+        for (top, bottom), path in zip(slices, paths):
+            atlas.crop((0, top, atlas.width, bottom)).save(path)
+        return
+    print_substep("Couldn't split the caption atlas, rendering captions one by one...")
+    for line, path in zip(lines, paths):
+        imgkit.from_string(f"<span>{line}</span>", path, css=css, options=options)
+
+
+def _split_atlas(atlas: Image.Image):
+    """Returns the (top, bottom) rows of every region between separator bars."""
+    pixels = np.asarray(atlas)
+    # the bar spans the body, which is most (but not all) of the width
+    separator_rows = (pixels == SEPARATOR_COLOR).all(axis=2).mean(axis=1) > 0.5
+    slices = []
+    top = 0
+    for row, is_separator in enumerate(separator_rows):
+        if is_separator:
+            if row > top:
+                slices.append((top, row))
+            top = row + 1
+    if top < len(separator_rows):
+        slices.append((top, len(separator_rows)))
+    return slices
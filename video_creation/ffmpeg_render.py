@@ -0,0 +1,123 @@
+import subprocess
+from typing import List
+
+from moviepy.config import get_setting
+
+from utils.console import print_substep
+
+W, H = 1080, 1920
+FPS = 30
+
+
+def render_ffmpeg(
+    background: str,
+    audio_files: List[str],
+    images: List[dict],
+    logo: dict,
+    animation: dict,
+    opacity: float,
+    transition: float,
+    length: float,
+    output: str,
+    filter_script: str,
+):
+    """Renders the final video with a single ffmpeg filtergraph instead of compositing every frame
+    in Python. The layers and their placement are the same as in the moviepy path.
+
+    Args:
+        background (str): Path of the chopped background video
+        audio_files (List[str]): The voice clips, in the order they are spoken
+        images (List[dict]): Title and caption images, shown one after the other. Each has a path,
+            duration, width, margin_bottom and margin_right
+        logo (dict): path, duration, height, top and fadein of the logo
+        animation (dict): path, start, margin_bottom and margin_right of the animation, already
+            keyed and resized by video_creation.animation.keyed_animation
+        opacity (float): Opacity of the images
+        transition (float): Fade in/out time of the images
+        length (float): Length of the final video
+        output (str): Where to save the video
+        filter_script (str): Where to write the filtergraph, it is too long for a command line
+    """
+    inputs = []
+    filters = []
+    layer = 0
+
+    def add_input(path: str, *options: str) -> int:
+        inputs.extend([*options, "-i", path])
+        return inputs.count("-i") - 1
+
+    def still(path: str, duration: float) -> int:
+        return add_input(path, "-loop", "1", "-framerate", str(FPS), "-t", f"{duration:.3f}")
+
+    def overlay(stream: str, x: str, y: str, start: float = None, end: float = None):
+        nonlocal layer
+        enable = f":enable='between(t,{start:.3f},{end:.3f})'" if start is not None else ""
+        filters.append(
+            f"[base{layer}][{stream}]overlay=x={x}:y={y}:eof_action=pass{enable}[base{layer + 1}]"
+        )
+        layer += 1
+
+    add_input(background)
+    # a no-op for backgrounds cut from the portrait proxy
+    filters.append(f"[0:v]scale=-2:{H},crop={W}:{H},setsar=1,fps={FPS}[base0]")
+
+    start = 0.0
+    for image in images:
+        duration = image["duration"]
+        index = still(image["path"], duration)
+        fades = ""
+        if transition:
+            fades = (
+                f",fade=t=in:st=0:d={transition}:alpha=1"
+                f",fade=t=out:st={max(duration - transition, 0):.3f}:d={transition}:alpha=1"
+            )
+        filters.append(
+            f"[{index}:v]scale={image['width']}:-1,format=rgba,colorchannelmixer=aa={opacity}"
+            f"{fades},setpts=PTS-STARTPTS+{start:.3f}/TB[img{index}]"
+        )
+        # margins are transparent borders in the moviepy path, so they shift the centered image
+        overlay(
+            f"img{index}",
+            f"(main_w-overlay_w-{image['margin_right']})/2",
+            f"(main_h-overlay_h-{image['margin_bottom']})/2",
+            start,
+            start + duration,
+        )
+        start += duration
+
+    index = still(logo["path"], logo["duration"])
+    logo_fade = f",fade=t=in:st=0:d={logo['fadein']}:alpha=1" if logo["fadein"] else ""
+    filters.append(f"[{index}:v]scale=-1:{logo['height']},format=rgba{logo_fade}[logo]")
+    overlay("logo", "(main_w-overlay_w)/2", str(logo["top"]))
+
+    index = add_input(animation["path"])
+    filters.append(f"[{index}:v]format=rgba,setpts=PTS-STARTPTS+{animation['start']:.3f}/TB[anim]")
+    overlay(
+        "anim",
+        f"(main_w-overlay_w-{animation['margin_right']})/2",
+        f"main_h-overlay_h-{animation['margin_bottom']}",
+    )
+    filters.append(f"[base{layer}]format=yuv420p[video]")
+
+    audio_inputs = ""
+    for audio_file in audio_files:
+        audio_inputs += f"[{add_input(audio_file)}:a]"
+    filters.append(f"{audio_inputs}concat=n={len(audio_files)}:v=0:a=1[audio]")
+
+    with open(filter_script, "w", encoding="utf-8") as script:
+        script.write(";\n".join(filters))
+
+    print_substep("Rendering with ffmpeg...")
+    # fmt: off
+    command = [
+        get_setting("FFMPEG_BINARY"), "-y", "-loglevel", "error",
+        *inputs,
+        "-filter_complex_script", filter_script,
+        "-map", "[video]", "-map", "[audio]",
+        "-r", str(FPS), "-c:v", "libx264", "-preset", "medium",
+        "-c:a", "aac", "-b:a", "192k",
+        "-t", f"{length:.3f}",
+        output,
+    ]
+    # fmt: on
+    subprocess.run(command, check=True)
@@ -5,23 +5,22 @@ import os
 import re
 import pickle
 from typing import Tuple, Any
-import imgkit
 import math
 from os.path import exists
-from moviepy.audio.AudioClip import concatenate_audioclips, CompositeAudioClip
-from moviepy.audio.io.AudioFileClip import AudioFileClip
-from moviepy.video.VideoClip import ImageClip
-from moviepy.video.compositing.CompositeVideoClip import CompositeVideoClip
-from moviepy.video.compositing.concatenate import concatenate_videoclips
-from moviepy.video.fx import mask_color
+from pathlib import Path
 from moviepy.video.io.VideoFileClip import VideoFileClip
-from moviepy.video.io.ffmpeg_tools import ffmpeg_extract_subclip
 from rich.console import Console
 
+from utils.audio import get_duration, load_manifest
 from utils.cleanup import cleanup
 from utils.console import print_step, print_substep
+from utils.translate import translate
 from utils.videos import save_data
 from utils import settings
+from video_creation.animation import keyed_animation
+from video_creation.captions import render_captions
+from video_creation.ffmpeg_render import render_ffmpeg
+from video_creation.moviepy_render import compose_with_moviepy
 
 console = Console()
 W, H = 1080, 1920
@@ -38,10 +37,8 @@ def name_normalize(name: str) -> str:
 
     lang = settings.config["reddit"]["thread"]["post_lang"]
     if lang:
-        import translators as ts
-
         print_substep("Translating filename...")
-        translated_name = ts.google(name, to_language=lang)
+        translated_name = translate(name, lang)
         return translated_name
 
     else:
@@ -56,7 +53,7 @@ def make_final_video(
     logo_path: str,
     animation_path: str,
 ):
-    """Gathers audio clips, gathers all screenshots, stitches them together and saves the final video to assets/temp
+    """Gathers audio clips, gathers all screenshots, stitches them together and saves the final video to results/<subreddit>
     Args:
         number_of_clips (int): Index to end at when going through the screenshots'
         length (int): Length of the video
@@ -75,45 +72,38 @@ def make_final_video(
     VideoFileClip.reH = lambda clip: clip.resize(width=H)
     opacity = settings.config["settings"]["opacity"]
     transition = settings.config["settings"]["transition"]
-    background_clip = (
-        VideoFileClip(f"assets/temp/{id}/background.mp4")
-        .without_audio()
-        .resize(height=H)
-        .crop(x1=1166.6, y1=0, x2=2246.6, y2=1920)
-    )
 
     # Gather all audio clips
-    
-    audio_clips = []
-    audio_clips.insert(0, AudioFileClip(f"assets/temp/{id}/mp3/title.mp3")) # add title tts mp3 at index 0
+    audio_files = [f"assets/temp/{id}/mp3/title.mp3"] # title tts mp3 first
 
     # START Gather and Insert split post tts mp3 files
     audio_list_len= len(pickle.load(open(f"assets/temp/{id}/mp3/post.pickle", "rb")))
     for index in range(audio_list_len):
-        audio_clips.insert(index+1, AudioFileClip(f"assets/temp/{id}/mp3/post.part{index}.mp3")) # add post tts parts at relevant indexes
+        audio_files.append(f"assets/temp/{id}/mp3/post.part{index}.mp3") # add post tts parts in order
     #END ather and Insert split post tts mp3 files
 
-    audio_concat = concatenate_audioclips(audio_clips)
-    audio_composite = CompositeAudioClip([audio_concat])
-    
-    
+    # Clip lengths measured by the TTS engine, so the timeline doesn't depend on the clip readers
+    durations = load_manifest(f"assets/temp/{id}/mp3")
+    clip_durations = [
+        durations.get(Path(audio_file).stem) or get_duration(audio_file) for audio_file in audio_files
+    ]
+
     console.log(f"[bold green] Video Will Be: {math.ceil(length)} Seconds Long")
 
 
     # BEGIN: Title Stuff
-    image_clips = []
-    # Gather all images
+    # Every image is described once here and then drawn by the selected render backend
+    image_layers = []
     new_opacity = 1 if opacity is None or float(opacity) >= 1 else float(opacity)
     new_transition = 0 if transition is None or float(transition) > 2 else float(transition)
-    image_clips.insert(
-        0,
-        ImageClip(f"assets/temp/{id}/png/title.png")
-        .set_duration(audio_clips[0].duration)
-        .resize(width=W - 100)
-        .margin(bottom=300, opacity=0) # for pulling Title image up towards logo
-        .set_opacity(new_opacity)
-        .crossfadein(new_transition)
-        .crossfadeout(new_transition)
+    image_layers.append(
+        {
+            "path": f"assets/temp/{id}/png/title.png",
+            "duration": clip_durations[0],
+            "width": W - 100,
+            "margin_bottom": 300, # for pulling Title image up towards logo
+            "margin_right": 0,
+        }
     )
     # END: Title Stuff
 
@@ -147,17 +137,21 @@ def make_final_video(
     'crop-w':  render_width,
     'quiet': ''
     }
+    render_captions(
+        post_captions,
+        [f"assets/temp/{id}/png/post.part{idy}.png" for idy in range(len(post_captions))],
+        css,
+        options,
+    )
     for idy, post_line in enumerate(post_captions):
-        imgkit.from_string(f"<span>{post_line}</span>", f"assets/temp/{id}/png/post.part{idy}.png", css=css, options=options)
-
-        image_clips.append(
-                ImageClip(f"assets/temp/{id}/png/post.part{idy}.png")
-                .resize(width=max_width)
-                .margin(right=cap_margin_right, opacity=0)
-                .set_duration(audio_clips[idy + 1].duration)
-                .set_opacity(new_opacity)
-                .crossfadein(new_transition)
-                .crossfadeout(new_transition)
+        image_layers.append(
+            {
+                "path": f"assets/temp/{id}/png/post.part{idy}.png",
+                "duration": clip_durations[idy + 1],
+                "width": max_width,
+                "margin_bottom": 0,
+                "margin_right": cap_margin_right,
+            }
         )
     #END: Post Text Caption stuff
 
@@ -173,7 +167,7 @@ def make_final_video(
         #     )
     
     # BEGIN: Logo stuff
-    total_duration = sum([i.duration for i in image_clips])
+    total_duration = sum([layer["duration"] for layer in image_layers])
     logo_transition_config = settings.config["settings"]["background"]["logo_fadein_duration"]
     if logo_transition_config is None:
         logo_transition = 0
@@ -182,12 +176,13 @@ def make_final_video(
     else:
         logo_transition = float(logo_transition_config)
 
-    logo = (ImageClip(logo_path)
-            .set_duration(total_duration)
-            .resize(height=400)  # if you need to resize...
-            .margin(top=300, opacity=0)  # (optional) logo-border padding
-            .crossfadein(logo_transition)
-            .set_pos(("center", "top")))
+    logo_layer = {
+        "path": logo_path,
+        "duration": total_duration,
+        "height": 400,  # if you need to resize...
+        "top": 300,  # (optional) logo-border padding
+        "fadein": logo_transition,
+    }
     #END: Logo stuff
 
     #BEGIN: Animation STuff
@@ -204,22 +199,18 @@ def make_final_video(
     
     showat_time = (total_duration - animation_clip.duration)/2
     showat_time=0 if showat_con == "start" else total_duration - animation_clip.duration
-        
-    masked_clip = mask_color.mask_color(animation_clip, color=[64, 222, 0], thr=150, s=5)
-    masked_clip = (masked_clip
-                    .resize(width=animation_width)
-                    .set_start(showat_time)
-                    .margin(bottom=300,right=animation_margin_right, opacity=0)
-                    .set_pos(('center', 'bottom')))
-    img_clip_pos = 'center'  # background_config[3]
-    image_concat = concatenate_videoclips(image_clips).set_position(
-        img_clip_pos
-    )  # note transition kwarg for delay in imgs
-    #END: Animation stuff
 
+    animation_clip.close()
+
+    animation_layer = {
+        # keyed and resized once, then reused by every render
+        "path": keyed_animation(animation_path, animation_width),
+        "start": showat_time,
+        "margin_bottom": 300,
+        "margin_right": animation_margin_right,
+    }
+    #END: Animation stuff
 
-    image_concat.audio = audio_composite
-    final = CompositeVideoClip([background_clip, image_concat, logo, masked_clip])
     title = re.sub(r"[^\w\s-]", "", reddit_obj["thread_title"])
     idx = re.sub(r"[^\w\s-]", "", reddit_obj["thread_id"])
 
@@ -228,7 +219,8 @@ def make_final_video(
 
     if not exists(f"./results/{subreddit}"):
         print_substep("The results folder didn't exist so I made it")
-        os.makedirs(f"./results/{subreddit}")
+    # another batch worker may create it at the same time
+    os.makedirs(f"./results/{subreddit}", exist_ok=True)
 
     # if settings.config["settings"]['background']["background_audio"] and exists(f"assets/backgrounds/background.mp3"):
     #    audioclip = mpe.AudioFileClip(f"assets/backgrounds/background.mp3").set_duration(final.duration)
@@ -241,24 +233,42 @@ def make_final_video(
     #     text=f"Background credit: {background_config[2]}", opacity=0.4, redditid=reddit_obj
     # )
 
-    # final = CompositeVideoClip([final, logo])
-    final.write_videofile(
-        f"assets/temp/{id}/temp.mp4",
-        fps=30,
-        audio_codec="aac",
-        audio_bitrate="192k",
-        verbose=False,
-        threads=multiprocessing.cpu_count(),
-        temp_audiofile=f"assets/temp/{id}/audio.mp4"
-    )
-    ffmpeg_extract_subclip(
-        f"assets/temp/{id}/temp.mp4",
-        0,
-        length,
-        targetname=f"results/{subreddit}/{filename}",
-    )
+    # Rendered straight into results/ under a temporary name and renamed once complete, so a
+    # crash never leaves a half written video with the final name
+    output = f"results/{subreddit}/{filename}"
+    partial_output = f"results/{subreddit}/.{id}.rendering.mp4"
+    if settings.config["settings"]["render_backend"] == "ffmpeg":
+        render_ffmpeg(
+            f"assets/temp/{id}/background.mp4",
+            audio_files,
+            image_layers,
+            logo_layer,
+            animation_layer,
+            new_opacity,
+            new_transition,
+            length,
+            partial_output,
+            f"assets/temp/{id}/filtergraph.txt",
+        )
+    else:
+        final = compose_with_moviepy(
+            id, audio_files, image_layers, logo_layer, animation_layer, new_opacity, new_transition
+        )
+        # final = CompositeVideoClip([final, logo])
+        final = final.set_duration(length)  # clamped here instead of trimming a second file
+        final.write_videofile(
+            partial_output,
+            fps=30,
+            codec="libx264",
+            audio_codec="aac",
+            audio_bitrate="192k",
+            verbose=False,
+            threads=multiprocessing.cpu_count(),
+            temp_audiofile=f"assets/temp/{id}/audio.mp4"
+        )
+    os.replace(partial_output, output)
     save_data(subreddit, filename, title, idx, background_config[1])
-    cleanup()
+    cleanup(id)
     print_substep("See result in the results folder!")
     print_step(
         f'Reddit title: {reddit_obj["thread_title"]} \nBackground Credit: {background_config[1]}'
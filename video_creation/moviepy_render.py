@@ -0,0 +1,75 @@
+# moviepy.editor also attaches the fx methods (resize, crop, margin...) to the clips
+from moviepy.editor import AudioFileClip, CompositeAudioClip, CompositeVideoClip, ImageClip
+from moviepy.editor import VideoFileClip, concatenate_audioclips, concatenate_videoclips
+
+from utils.profiler import profiler
+from video_creation.animation import load_keyed_animation
+
+W, H = 1080, 1920
+
+
+def compose_with_moviepy(
+    id: str,
+    audio_files: list,
+    image_layers: list,
+    logo_layer: dict,
+    animation_layer: dict,
+    opacity: float,
+    transition: float,
+) -> CompositeVideoClip:
+    """Builds the final video as a moviepy composite, drawn frame by frame in Python."""
+    background_source = profiler.time_frames(
+        VideoFileClip(f"assets/temp/{id}/background.mp4").without_audio(), "background decode"
+    )
+    if tuple(background_source.size) == (W, H):  # cut from the portrait proxy
+        background_clip = background_source
+    else:
+        background_clip = background_source.resize(height=H).crop(
+            x1=1166.6, y1=0, x2=2246.6, y2=1920
+        )
+
+    audio_clips = [AudioFileClip(audio_file) for audio_file in audio_files]
+    audio_concat = concatenate_audioclips(audio_clips)
+    audio_composite = CompositeAudioClip([audio_concat])
+
+    image_clips = [
+        ImageClip(layer["path"])
+        .set_duration(layer["duration"])
+        .resize(width=layer["width"])
+        .margin(bottom=layer["margin_bottom"], right=layer["margin_right"], opacity=0)
+        .set_opacity(opacity)
+        .crossfadein(transition)
+        .crossfadeout(transition)
+        for layer in image_layers
+    ]
+
+    logo = (ImageClip(logo_layer["path"])
+            .set_duration(logo_layer["duration"])
+            .resize(height=logo_layer["height"])
+            .margin(top=logo_layer["top"], opacity=0)
+            .crossfadein(logo_layer["fadein"])
+            .set_pos(("center", "top")))
+
+    masked_clip = load_keyed_animation(animation_layer["path"])
+    masked_clip = (masked_clip
+                    .set_start(animation_layer["start"])
+                    .margin(
+                        bottom=animation_layer["margin_bottom"],
+                        right=animation_layer["margin_right"],
+                        opacity=0,
+                    )
+                    .set_pos(('center', 'bottom')))
+    img_clip_pos = 'center'  # background_config[3]
+    image_concat = concatenate_videoclips(image_clips).set_position(
+        img_clip_pos
+    )  # note transition kwarg for delay in imgs
+
+    image_concat.audio = audio_composite
+    return CompositeVideoClip(
+        [
+            profiler.time_frames(background_clip, "background"),
+            profiler.time_frames(image_concat, "captions"),
+            profiler.time_frames(logo, "logo"),
+            profiler.time_frames(masked_clip, "animation"),
+        ]
+    )
@@ -1,21 +1,23 @@
-import json
+import asyncio
+import os
 
 from pathlib import Path
 import re
-from typing import Dict
+from typing import Dict, List
 from utils import settings
-from playwright.async_api import async_playwright  # pylint: disable=unused-import
+from playwright.async_api import BrowserContext, Page, ViewportSize
+from playwright.async_api import Error as PlaywrightError
 import PIL
 from PIL import Image
-# do not remove the above line
 
-from playwright.sync_api import sync_playwright, ViewportSize
-from rich.progress import track
-import translators as ts
+from rich.progress import Progress
 
 from utils.console import print_step, print_substep
+from utils.translate import translate, translate_many
+from video_creation.browser import browser_service
 
 storymode = False
+COMMENT_TIMEOUT = 30  # seconds a single comment screenshot may take before it is skipped
 
 
 def download_screenshots_of_reddit_posts(reddit_object: dict, screenshot_num: int):
@@ -29,45 +31,32 @@ def download_screenshots_of_reddit_posts(reddit_object: dict, screenshot_num: in
     id = re.sub(r"[^\w\s-]", "", reddit_object["thread_id"])
     # ! Make sure the reddit screenshots folder exists
     Path(f"assets/temp/{id}/png").mkdir(parents=True, exist_ok=True)
+    browser_service().run(take_screenshots(reddit_object, screenshot_num, id))
+    print_substep("Screenshots downloaded Successfully.", style="bold green")
 
-    with sync_playwright() as p:
-        print_substep("Launching Headless Browser...")
 
-        browser = p.chromium.launch()
-        context = browser.new_context()
-
-        if settings.config["settings"]["theme"] == "dark":
-            cookie_file = open("./video_creation/data/cookie-dark-mode.json", encoding="utf-8")
-        else:
-            cookie_file = open("./video_creation/data/cookie-light-mode.json", encoding="utf-8")
-        cookies = json.load(cookie_file)
-        context.add_cookies(cookies)  # load preference cookies
+async def take_screenshots(reddit_object: dict, screenshot_num: int, id: str):
+    async with browser_service().lease(settings.config["settings"]["theme"]) as context:
         # Get the thread screenshot
-        page = context.new_page()
-        page.goto(reddit_object["thread_url"], timeout=0)
-        page.set_viewport_size(ViewportSize(width=1920, height=1080))
-        if page.locator('[data-testid="content-gate"]').is_visible():
-            # This means the post is NSFW and requires to click the proceed button.
-
-            print_substep("Post is NSFW. You are spicy...")
-            page.locator('[data-testid="content-gate"] button').click()
-            page.wait_for_load_state()  # Wait for page to fully load
-
-            if page.locator('[data-click-id="text"] button').is_visible():
-                page.locator(
-                    '[data-click-id="text"] button'
-                ).click()  # Remove "Click to see nsfw" Button in Screenshot
+        page = await context.new_page()
+        await page.goto(reddit_object["thread_url"], timeout=0)
+        await page.set_viewport_size(ViewportSize(width=1920, height=1080))
+        await pass_content_gate(page)
 
         # translate code
 
         if settings.config["reddit"]["thread"]["post_lang"]:
             print_substep("Translating post...")
-            texts_in_tl = ts.google(
-                reddit_object["thread_title"],
-                to_language=settings.config["reddit"]["thread"]["post_lang"],
+            # the title and every comment we'll capture, in one batch
+            translate_many(
+                [reddit_object["thread_title"]]
+                + [comment["comment_body"] for comment in reddit_object["comments"]][
+                    :screenshot_num
+                ]
             )
+            texts_in_tl = translate(reddit_object["thread_title"])
 
-            page.evaluate(
+            await page.evaluate(
                 "tl_content => document.querySelector('[data-test-id=\"post-content\"] > div:nth-child(3) > div > div').textContent = tl_content",
                 texts_in_tl,
             )
@@ -77,9 +66,9 @@ def download_screenshots_of_reddit_posts(reddit_object: dict, screenshot_num: in
         post_title_ss = f"assets/temp/{id}/png/title"
 
         # START Screenshoting only the title instead of full post content - ActualAkshay
-        page.locator('[data-test-id="post-content"] > div:nth-child(2)').screenshot(path= f"{post_title_ss}.part1.png")        
-        page.locator('[data-test-id="post-content"] > div:nth-child(3)').screenshot(path= f"{post_title_ss}.part2.png")
-        
+        await page.locator('[data-test-id="post-content"] > div:nth-child(2)').screenshot(path= f"{post_title_ss}.part1.png")
+        await page.locator('[data-test-id="post-content"] > div:nth-child(3)').screenshot(path= f"{post_title_ss}.part2.png")
+
         total_height = 0
         max_width = 0
         tt_ss_a    = [ Image.open(i) for i in [f"{post_title_ss}.part1.png", f"{post_title_ss}.part2.png"] ]
@@ -96,40 +85,92 @@ def download_screenshots_of_reddit_posts(reddit_object: dict, screenshot_num: in
         # END cutom Screenshot title
 
         if storymode:
-            page.locator('[data-click-id="text"]').screenshot(
+            await page.locator('[data-click-id="text"]').screenshot(
                 path=f"assets/temp/{id}/png/story_content.png"
             )
-        else:
-            for idx, comment in enumerate(
-                track(reddit_object["comments"], "Downloading screenshots...")
-            ):
-                # Stop if we have reached the screenshot_num
-                if idx >= screenshot_num:
-                    break
-
-                if page.locator('[data-testid="content-gate"]').is_visible():
-                    page.locator('[data-testid="content-gate"] button').click()
-
-                page.goto(f'https://reddit.com{comment["comment_url"]}', timeout=0)
-
-                # translate code
-
-                if settings.config["reddit"]["thread"]["post_lang"]:
-                    comment_tl = ts.google(
-                        comment["comment_body"],
-                        to_language=settings.config["reddit"]["thread"]["post_lang"],
-                    )
-                    page.evaluate(
-                        '([tl_content, tl_id]) => document.querySelector(`#t1_${tl_id} > div:nth-child(2) > div > div[data-testid="comment"] > div`).textContent = tl_content',
-                        [comment_tl, comment["comment_id"]],
-                    )
-                try:
-                    page.locator(f"#t1_{comment['comment_id']}").screenshot(
-                        path=f"assets/temp/{id}/png/comment_{idx}.png"
-                    )
-                except TimeoutError:
-                    del reddit_object["comments"]
-                    screenshot_num += 1
-                    print("TimeoutError: Skipping screenshot...")
-                    continue
-        print_substep("Screenshots downloaded Successfully.", style="bold green")
\ No newline at end of file
+        browser_service().request_filter.report(page)
+        await page.close()
+        if not storymode and screenshot_num:
+            comments = reddit_object["comments"]
+            captured = await capture_comments(context, comments[:screenshot_num], id)
+            reddit_object["comments"] = captured + comments[screenshot_num:]
+
+
+async def pass_content_gate(page: Page):
+    if await page.locator('[data-testid="content-gate"]').is_visible():
+        # This means the post is NSFW and requires to click the proceed button.
+
+        print_substep("Post is NSFW. You are spicy...")
+        await page.locator('[data-testid="content-gate"] button').click()
+        await page.wait_for_load_state()  # Wait for page to fully load
+
+        if await page.locator('[data-click-id="text"] button').is_visible():
+            await page.locator(
+                '[data-click-id="text"] button'
+            ).click()  # Remove "Click to see nsfw" Button in Screenshot
+
+
+async def capture_comments(context: BrowserContext, comments: List[Dict], id: str) -> List[Dict]:
+    """Screenshots the comments with settings.screenshot_pages pages working at the same time,
+    each taking the next comment from a queue.
+
+    A comment that fails or takes longer than COMMENT_TIMEOUT is skipped. The screenshots that
+    worked are saved as comment_0.png, comment_1.png... in the order of the comments.
+
+    Returns:
+        List[Dict]: The comments that have a screenshot, their index matches the file name
+    """
+    queue = asyncio.Queue()
+    for idx, comment in enumerate(comments):
+        queue.put_nowait((idx, comment))
+    captured = {}  # idx -> path of the screenshot
+
+    with Progress() as progress:
+        task = progress.add_task("Downloading screenshots...", total=len(comments))
+
+        async def work():
+            page = await context.new_page()
+            await page.set_viewport_size(ViewportSize(width=1920, height=1080))
+            try:
+                while not queue.empty():
+                    idx, comment = queue.get_nowait()
+                    path = f"assets/temp/{id}/png/comment_{idx}.capture.png"
+                    try:
+                        await asyncio.wait_for(
+                            capture_comment(page, comment, path), timeout=COMMENT_TIMEOUT
+                        )
+                        captured[idx] = path
+                    except (PlaywrightError, asyncio.TimeoutError) as error:
+                        print_substep(
+                            f"Skipping the screenshot of comment {comment['comment_id']}: "
+                            f"{type(error).__name__}"
+                        )
+                    progress.advance(task)
+            finally:
+                browser_service().request_filter.report(page)
+                await page.close()
+
+        pages = max(1, min(settings.config["settings"]["screenshot_pages"], len(comments)))
+        await asyncio.gather(*(work() for _ in range(pages)))
+
+    kept = []
+    for idx in sorted(captured):
+        os.replace(captured[idx], f"assets/temp/{id}/png/comment_{len(kept)}.png")
+        kept.append(comments[idx])
+    return kept
+
+
+async def capture_comment(page: Page, comment: dict, path: str):
+    await page.goto(f'https://reddit.com{comment["comment_url"]}')
+    if await page.locator('[data-testid="content-gate"]').is_visible():
+        await page.locator('[data-testid="content-gate"] button').click()
+
+    # translate code
+
+    if settings.config["reddit"]["thread"]["post_lang"]:
+        comment_tl = translate(comment["comment_body"])
+        await page.evaluate(
+            '([tl_content, tl_id]) => document.querySelector(`#t1_${tl_id} > div:nth-child(2) > div > div[data-testid="comment"] > div`).textContent = tl_content',
+            [comment_tl, comment["comment_id"]],
+        )
+    await page.locator(f"#t1_{comment['comment_id']}").screenshot(path=path)
@@ -0,0 +1,104 @@
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import List
+
+from PIL import Image, ImageDraw, ImageFont
+
+from utils import settings
+from utils.console import print_step, print_substep
+from utils.translate import translate
+
+WIDTH = 980  # the title is shown 980 pixels wide (W - 100) in the final video
+PADDING = 40
+TITLE_SIZE = 56
+META_SIZE = 32
+LINE_SPACING = 12
+THEMES = {
+    "dark": {"background": (26, 26, 27), "title": (215, 218, 220), "meta": (129, 131, 132)},
+    "light": {"background": (255, 255, 255), "title": (28, 28, 28), "meta": (120, 124, 126)},
+}
+# Tried in order when settings.title_font isn't set, the first one installed is used
+FALLBACK_FONTS = [
+    "DejaVuSans-Bold.ttf",
+    "LiberationSans-Bold.ttf",
+    "NotoSans-Bold.ttf",
+    "FreeSansBold.ttf",
+    "arialbd.ttf",
+    "Arial Bold.ttf",
+    "Helvetica.ttc",
+]
+
+
+@lru_cache(maxsize=None)
+def load_font(size: int) -> ImageFont.FreeTypeFont:
+    """The title font at size, loaded once per process."""
+    fonts = [settings.config["settings"].get("title_font")] + FALLBACK_FONTS
+    for font in filter(None, fonts):
+        try:
+            return ImageFont.truetype(font, size)
+        except OSError:
+            continue
+    # Pillow's own default font is latin-1 only, it can't draw most reddit titles
+    raise RuntimeError(
+        "No TrueType font found for the title card. Set settings.title_font to a .ttf file, "
+        f"install one of {', '.join(FALLBACK_FONTS)} or use title_card = \"screenshot\""
+    )
+
+
+def wrap(draw: ImageDraw.ImageDraw, text: str, font: ImageFont.ImageFont, width: int) -> List[str]:
+    """Splits text into lines that fit in width pixels, breaking between words."""
+    lines = []
+    line = ""
+    for word in text.split():
+        candidate = f"{line} {word}".strip()
+        if line and draw.textlength(candidate, font=font) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = candidate
+    if line:
+        lines.append(line)
+    return lines
+
+
+def render_title_card(reddit_object: dict):
+    """Draws the title card of the post to assets/temp/<id>/png/title.png, without a browser.
+
+    The card shows the subreddit, the author, the title and the score, in the colors of
+    settings.theme. It is drawn at the width it has in the final video.
+
+    Args:
+        reddit_object (Dict): Reddit object received from reddit/subreddit.py
+    """
+    print_step("Drawing the title card...")
+    id = re.sub(r"[^\w\s-]", "", reddit_object["thread_id"])
+    Path(f"assets/temp/{id}/png").mkdir(parents=True, exist_ok=True)
+    colors = THEMES.get(settings.config["settings"]["theme"], THEMES["dark"])
+    title_font = load_font(TITLE_SIZE)
+    meta_font = load_font(META_SIZE)
+
+    title = reddit_object["thread_title"]
+    if settings.config["reddit"]["thread"]["post_lang"]:
+        title = translate(title)
+    header = f"r/{reddit_object['subreddit']} · Posted by u/{reddit_object['author']}"
+    footer = f"{reddit_object['score']} points"
+
+    measure = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+    lines = wrap(measure, title, title_font, WIDTH - 2 * PADDING)
+    title_line_height = measure.textbbox((0, 0), "Ag", font=title_font)[3] + LINE_SPACING
+    meta_line_height = measure.textbbox((0, 0), "Ag", font=meta_font)[3]
+    height = 2 * PADDING + 2 * (meta_line_height + PADDING // 2) + len(lines) * title_line_height
+
+    card = Image.new("RGB", (WIDTH, height), colors["background"])
+    draw = ImageDraw.Draw(card)
+    y = PADDING
+    draw.text((PADDING, y), header, fill=colors["meta"], font=meta_font)
+    y += meta_line_height + PADDING // 2
+    for line in lines:
+        draw.text((PADDING, y), line, fill=colors["title"], font=title_font)
+        y += title_line_height
+    y += PADDING // 2
+    draw.text((PADDING, y), footer, fill=colors["meta"], font=meta_font)
+    card.save(f"assets/temp/{id}/png/title.png")
+    print_substep("Title card drawn successfully.", style="bold green")